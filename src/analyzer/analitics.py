@@ -1,20 +1,22 @@
 import logging
 
+import numpy as np
 import pandas as pd
 from kmodes.kmodes import KModes
 from mlxtend.frequent_patterns import association_rules
 from mlxtend.frequent_patterns import fpgrowth
 from mlxtend.preprocessing import TransactionEncoder
+from scipy.sparse import csr_matrix, triu
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics import silhouette_score
 
-from .processor import corr_tfidf_to_questions, extract_value
+from .processor import corr_tfidf_to_questions, corr_sparse_to_questions_array, extract_value
 from .processor import log_with_print
 
 logger = logging.getLogger(__name__)
 
 
-def k_mode_clusters(answers, len_questions):
+def k_mode_clusters(answers, len_questions, random_state=None):
     """
         Выполняет кластеризацию методом K-Modes для категориальных данных ответов на вопросы.
 
@@ -26,6 +28,7 @@ def k_mode_clusters(answers, len_questions):
         Параметры:
           - answers (List[List[str]]): Список ответов, где каждый ответ - список строковых кодов.
           - len_questions (int): Количество вопросов в анкете (используется для расчета диапазона кластеров).
+          - random_state (int | None): Начальное значение генератора случайных чисел K-Modes (None — глобальный np.random).
 
         Возвращаемое значение:
           Tuple[pd.DataFrame, int]:
@@ -42,7 +45,7 @@ def k_mode_clusters(answers, len_questions):
     silhouette_scores = []
     logger.info("Подбираем оптимальное число кластеров...")
     for n_clusters in range(3, round(len_questions / 5)):  # проверяем от 2 до 6
-        km = KModes(n_clusters=n_clusters, init='Cao', n_init=5, verbose=0)
+        km = KModes(n_clusters=n_clusters, init='Cao', n_init=5, verbose=0, random_state=random_state)
         clusters = km.fit_predict(df)
         try:
             score = silhouette_score(df, clusters, metric="hamming")
@@ -52,13 +55,14 @@ def k_mode_clusters(answers, len_questions):
             log_with_print(f"Не удалось вычислить Silhouette Score для {n_clusters} кластеров")
     best_n, best_score = max(silhouette_scores, key=lambda x: x[1])
     log_with_print(f"Лучшее число кластеров для текущей выборки: {best_n}")
-    km = KModes(n_clusters=best_n, init='Huang', n_init=10)
+    km = KModes(n_clusters=best_n, init='Huang', n_init=10, random_state=random_state)
     clusters = km.fit_predict(df)
     df["cluster"] = clusters
     return df, best_n
 
 
-def get_strong_pairs(answers, ignored_codes, possible_answers_list, questions, strong_pairs_coefficient):
+def get_strong_pairs(answers, ignored_codes, possible_answers_list, questions, strong_pairs_coefficient,
+                     correlation_engine="pandas", correlation_dtype="float64"):
     """
         Выполняет анализ сильных пар вопросов на основе TF-IDF и корреляционных матриц.
 
@@ -66,6 +70,8 @@ def get_strong_pairs(answers, ignored_codes, possible_answers_list, questions, s
           1. Векторизацию текста ответов с использованием TF-IDF.
           2. Расчет корреляционной матрицы для выявления взаимосвязей между ответами.
           3. Расчет корреляционной матрицы для выявления взаимосвязей между вопросами на основе ответов.
+             При correlation_engine="sparse" шаги 2 и 3 выполняются по разреженной матрице TF-IDF
+             (corr_sparse_to_questions_array) без построения плотных матриц.
           4. Фильтрацию пар вопросов по порогу коэффициента корреляции.
 
         Параметры:
@@ -74,6 +80,8 @@ def get_strong_pairs(answers, ignored_codes, possible_answers_list, questions, s
           - possible_answers_list (List[str]): Список допустимых вариантов ответов для привязки к вопросам.
           - questions (Dict[str, List[Tuple[str, str]]]): Словарь опросника.
           - strong_pairs_coefficient (float): Порог корреляции для определения "сильных" пар вопросов.
+          - correlation_engine (str): "pandas" — DataFrame.corr() по плотной матрице, "sparse" — корреляция по разреженной матрице.
+          - correlation_dtype (str): Тип вычислений для correlation_engine="sparse" ("float64" или "float32").
 
         Возвращаемое значение:
           - pd.DataFrame: DataFrame с колонками ["Вопрос 1", "Вопрос 2", "Корреляция"], где вопросы представлены их индексами из исходного списка.
@@ -81,9 +89,15 @@ def get_strong_pairs(answers, ignored_codes, possible_answers_list, questions, s
     vectorizer = TfidfVectorizer()
     texts = [" ".join(code[:3] for code in row if code[:3] not in ignored_codes) for row in answers]
     x = vectorizer.fit_transform(texts)
-    tfidf_df = pd.DataFrame(x.toarray(), columns=vectorizer.get_feature_names_out())
-    correlation_matrix = tfidf_df.corr()
-    questions_corr = corr_tfidf_to_questions(correlation_matrix, possible_answers_list, questions)
+    if correlation_engine == "sparse":
+        questions_corr = pd.DataFrame(
+            corr_sparse_to_questions_array(x, vectorizer.get_feature_names_out(), possible_answers_list,
+                                           np.dtype(correlation_dtype)),
+            index=questions.keys(), columns=questions.keys())
+    else:
+        tfidf_df = pd.DataFrame(x.toarray(), columns=vectorizer.get_feature_names_out())
+        correlation_matrix = tfidf_df.corr()
+        questions_corr = corr_tfidf_to_questions(correlation_matrix, possible_answers_list, questions)
     strong_pairs = questions_corr.stack().reset_index()
     strong_pairs.columns = ["Вопрос 1", "Вопрос 2", "Корреляция"]
     strong_pairs = strong_pairs[strong_pairs["Корреляция"] > strong_pairs_coefficient]
@@ -94,26 +108,245 @@ def get_strong_pairs(answers, ignored_codes, possible_answers_list, questions, s
     return strong_pairs_index
 
 
-def get_rules(answers):
+RULE_ROW_BYTES = 256
+RULE_COLUMNS = ["antecedents", "consequents", "antecedent support", "consequent support", "support", "confidence",
+                "lift", "representativity", "leverage", "conviction", "zhangs_metric", "jaccard", "certainty",
+                "kulczynski"]
+
+
+def get_rules(answers, rule_miner="fpgrowth", max_rules=0, memory_budget_mb=0):
     """
     Генерирует ассоциативные правила из набора ответов с использованием алгоритма FP-Growth.
 
+    При rule_miner="pairs" правила строятся через mine_pair_rules с теми же порогами и колонками.
+    Если задан max_rules или memory_budget_mb, пороги поддержки и confidence подбираются через choose_rule_thresholds,
+    а если порогами предел не достигается — таблица правил обрезается до него (limit_rules).
+
     Процесс включает:
       1. Преобразование ответов в бинарную матрицу через TransactionEncoder.
-      2. Поиск частых itemset'ов с минимальной поддержкой 0.01.
-      3. Генерация правил ассоциации с фильтрацией по метрике confidence (минимальный порог 0.01).
+      2. Поиск частых itemset'ов с минимальной поддержкой 0.01 (или подобранной choose_rule_thresholds).
+      3. Генерация правил ассоциации с фильтрацией по метрике confidence (минимальный порог 0.01 или подобранный).
 
     Параметры:
       - answers (List[List[str]]): Список ответов респондентов, где каждый элемент — список строковых кодов ответов [[6]].
+      - rule_miner (str): "fpgrowth" — mlxtend fpgrowth и association_rules, "pairs" — mine_pair_rules.
+      - max_rules (int): Максимальное количество правил (0 — без ограничения).
+      - memory_budget_mb (float): Ограничение памяти на таблицу правил в мегабайтах (0 — без ограничения).
 
     Возвращаемое значение:
       - pd.DataFrame: DataFrame с колонками "antecedents" (предпосылки) и "consequents" (следствия), где значения преобразованы из frozenset в строки через функцию extract_value.
     """
+    min_support, min_confidence, pair_counts = choose_rule_thresholds(answers, max_rules, memory_budget_mb)
+    limit = rule_limit(max_rules, memory_budget_mb)
+    if rule_miner == "pairs":
+        return limit_rules(mine_pair_rules(answers, min_support=min_support, min_confidence=min_confidence,
+                                           pair_counts=pair_counts), limit)
     te = TransactionEncoder()
     te_ary = te.fit(answers).transform(answers)
     df = pd.DataFrame(te_ary, columns=te.columns_)
-    frequent_itemsets = fpgrowth(df, min_support=0.01, use_colnames=True, max_len=2)
-    rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=0.01)
+    frequent_itemsets = fpgrowth(df, min_support=min_support, use_colnames=True, max_len=2)
+    rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_confidence)
     rules["antecedents"] = rules["antecedents"].apply(extract_value)
     rules["consequents"] = rules["consequents"].apply(extract_value)
-    return rules
+    # порядок itemset'ов fpgrowth зависит от хэширования строк, правила упорядочиваются для воспроизводимости
+    rules = rules.sort_values(["antecedents", "consequents"], kind="stable").reset_index(drop=True)
+    return limit_rules(rules, limit)
+
+
+def mine_pair_rules(answers, min_support, min_confidence, pair_counts=None):
+    """
+    Строит ассоциативные правила вида "ответ -> ответ" (аналог fpgrowth с max_len=2) без плотного кодирования анкет.
+
+    Процесс включает:
+      1. Кодирование анкет разреженной бинарной матрицей (анкеты × ответы).
+      2. Отбор частых ответов по поддержке (сумма по столбцам / число анкет >= min_support).
+      3. Расчет совместной встречаемости частых ответов одним произведением XᵀX и отбор частых пар.
+      4. Расчет метрик для обоих направлений каждой пары и фильтрацию по confidence >= min_confidence.
+
+    Параметры:
+      - answers (List[List[str]]): Список анкет.
+      - min_support (float): Минимальная поддержка ответов и пар.
+      - min_confidence (float): Минимальная достоверность правила.
+      - pair_counts (Tuple | None): Результат count_pair_rules с поддержкой не выше min_support
+        (например, из choose_rule_thresholds). Если передан, пары отбираются по min_support без повторного подсчета.
+
+    Возвращаемое значение:
+      pd.DataFrame: Правила с колонками association_rules из mlxtend (RULE_COLUMNS), где antecedents и consequents —
+      строки; правила отсортированы по antecedents, затем по consequents.
+    """
+    if pair_counts is None:
+        pair_counts = count_pair_rules(answers, min_support)
+    items, item_support, antecedents, consequents, s_ac = pair_counts
+    # частая пара состоит из частых ответов, поэтому при более низком пороге подсчета достаточно отбора пар
+    frequent_pairs = s_ac >= min_support
+    antecedents, consequents, s_ac = antecedents[frequent_pairs], consequents[frequent_pairs], s_ac[frequent_pairs]
+    if not len(items):
+        return pd.DataFrame(columns=RULE_COLUMNS)
+    s_a = item_support[antecedents]
+    s_c = item_support[consequents]
+    confidence = s_ac / s_a
+    selected = confidence >= min_confidence
+    antecedents, consequents = antecedents[selected], consequents[selected]
+    s_ac, s_a, s_c, confidence = s_ac[selected], s_a[selected], s_c[selected], confidence[selected]
+    leverage = s_ac - s_a * s_c
+    conviction = np.full(len(confidence), np.inf)
+    conviction[confidence < 1.0] = (1.0 - s_c[confidence < 1.0]) / (1.0 - confidence[confidence < 1.0])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zhang_denominator = np.maximum(s_ac * (1 - s_a), s_a * (s_c - s_ac))
+        zhangs_metric = np.where(zhang_denominator == 0, 0, leverage / zhang_denominator)
+        certainty = np.where(1 - s_c == 0, 0, (confidence - s_c) / (1 - s_c))
+    rules = pd.DataFrame({"antecedents": items[antecedents], "consequents": items[consequents],
+                          "antecedent support": s_a, "consequent support": s_c, "support": s_ac,
+                          "confidence": confidence, "lift": confidence / s_c,
+                          "representativity": np.ones(len(confidence)), "leverage": leverage,
+                          "conviction": conviction, "zhangs_metric": zhangs_metric,
+                          "jaccard": s_ac / (s_a + s_c - s_ac), "certainty": certainty,
+                          "kulczynski": (s_ac / s_a + s_ac / s_c) / 2}, columns=RULE_COLUMNS)
+    return rules.sort_values(["antecedents", "consequents"], kind="stable").reset_index(drop=True)
+
+
+def count_pair_rules(answers, min_support):
+    """
+    Подсчитывает поддержку ответов и частых пар ответов по разреженной бинарной матрице анкет.
+
+    Параметры:
+      - answers (List[List[str]]): Список анкет.
+      - min_support (float): Минимальная поддержка ответов и пар.
+
+    Возвращаемое значение:
+      Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        - items: Ответы (словарь столбцов матрицы).
+        - item_support: Поддержка каждого ответа.
+        - antecedents, consequents: Индексы ответов для обоих направлений каждой частой пары.
+        - pair_support: Поддержка пары для каждого направления.
+    """
+    item_to_id = {}
+    indices = []
+    indptr = [0]
+    for row in answers:
+        for item in dict.fromkeys(row):
+            indices.append(item_to_id.setdefault(item, len(item_to_id)))
+        indptr.append(len(indices))
+    rows_count = len(answers)
+    items = np.array(list(item_to_id.keys()), dtype=object)
+    if not rows_count or not len(items):
+        empty = np.array([], dtype=np.int64)
+        return items[:0], np.array([]), empty, empty, np.array([])
+    x = csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr), shape=(rows_count, len(items)))
+    item_support = np.asarray(x.sum(axis=0)).ravel() / rows_count
+    frequent = np.flatnonzero(item_support >= min_support)
+    x = x[:, frequent]
+    co_occurrence = triu(x.T @ x, k=1).tocoo()
+    pair_support = co_occurrence.data / rows_count
+    pair_frequent = pair_support >= min_support
+    first = frequent[co_occurrence.row[pair_frequent]]
+    second = frequent[co_occurrence.col[pair_frequent]]
+    pair_support = pair_support[pair_frequent]
+    return (items, item_support, np.concatenate([first, second]), np.concatenate([second, first]),
+            np.concatenate([pair_support, pair_support]))
+
+
+def rule_limit(max_rules, memory_budget_mb):
+    """
+    Рассчитывает предел числа ассоциативных правил: min(max_rules, memory_budget_mb / RULE_ROW_BYTES).
+
+    Возвращаемое значение:
+      int: Предел числа правил (0 — без ограничения).
+    """
+    limits = []
+    if max_rules:
+        limits.append(int(max_rules))
+    if memory_budget_mb:
+        limits.append(int(memory_budget_mb * 1024 * 1024 / RULE_ROW_BYTES))
+    if not limits:
+        return 0
+    return max(min(limits), 1)
+
+
+def choose_rule_thresholds(answers, max_rules, memory_budget_mb, min_support=0.01, min_confidence=0.01):
+    """
+    Подбирает пороги поддержки и достоверности так, чтобы число правил не превышало заданного предела.
+
+    Процесс включает:
+      1. Расчет предела числа правил (rule_limit); 0 — без ограничения.
+      2. Подсчет поддержки пар ответов (count_pair_rules) при базовых порогах min_support и min_confidence.
+      3. Если правил больше предела — выбор из двух вариантов того, при котором остается больше правил:
+          - повышение порога поддержки до наименьшего значения, при котором правил не больше предела;
+          - порог поддержки на уровне правила с номером предела и отбор правил с этой и большей поддержкой
+            по достоверности (правила с равной поддержкой на границе не отбрасываются целиком).
+
+    Правила с равными поддержкой и достоверностью на границе отбрасываются вместе, поэтому правил может
+    остаться меньше предела. Если порогами предел не достигается (все правила на границе равны),
+    пороги не меняются, а таблица правил обрезается до предела в get_rules (limit_rules).
+
+    Параметры:
+      - answers (List[List[str]]): Список анкет.
+      - max_rules (int): Максимальное количество правил (0 — без ограничения).
+      - memory_budget_mb (float): Ограничение памяти на таблицу правил в мегабайтах (0 — без ограничения).
+      - min_support (float): Базовый порог поддержки.
+      - min_confidence (float): Базовый порог достоверности.
+
+    Возвращаемое значение:
+      Tuple[float, float, Tuple | None]: Выбранные пороги поддержки и достоверности и результат count_pair_rules
+      при базовом пороге поддержки (None, если ограничение не задано) для повторного использования в mine_pair_rules.
+    """
+    limit = rule_limit(max_rules, memory_budget_mb)
+    if not limit:
+        return min_support, min_confidence, None
+    pair_counts = count_pair_rules(answers, min_support)
+    items, item_support, antecedents, _, pair_support = pair_counts
+    confidence = pair_support / item_support[antecedents] if len(items) else pair_support
+    selected = confidence >= min_confidence
+    pair_support, confidence = pair_support[selected], confidence[selected]
+    if len(pair_support) > limit:
+        support_threshold, support_kept = limit_threshold(pair_support, limit)
+        support_at_limit = float(np.sort(pair_support)[::-1][limit - 1])
+        confidence_threshold, confidence_kept = limit_threshold(confidence[pair_support >= support_at_limit], limit)
+        if confidence_kept > support_kept:
+            min_support, min_confidence = support_at_limit, max(min_confidence, confidence_threshold)
+        elif support_threshold is not None:
+            min_support = support_threshold
+    kept = int(np.count_nonzero((pair_support >= min_support) & (confidence >= min_confidence)))
+    logger.info(f"Пороги ассоциативных правил: min_support={min_support:.6f}, min_confidence={min_confidence:.6f} "
+                f"(предел правил: {limit}, останется правил: {min(kept, limit)}).")
+    if kept > limit:
+        logger.warning(f"Порогами не удалось ограничить число правил: {kept} правил проходят пороги "
+                       f"(равные поддержка и достоверность на границе), таблица правил будет обрезана до {limit}.")
+    return min_support, min_confidence, pair_counts
+
+
+def limit_threshold(values, limit):
+    """
+    Находит наименьший порог, при котором значений не меньше порога не больше limit.
+
+    Возвращаемое значение:
+      Tuple[float | None, int]: Порог (None, если все значения на границе равны и порога нет) и число значений,
+      проходящих порог.
+    """
+    if len(values) <= limit:
+        return (float(values.min()) if len(values) else None), len(values)
+    first_excluded = np.sort(values)[::-1][limit]
+    above = values[values > first_excluded]
+    if not len(above):
+        return None, 0
+    return float(above.min()), len(above)
+
+
+def limit_rules(rules, limit):
+    """
+    Оставляет в таблице правил не больше limit правил с наибольшими поддержкой и достоверностью.
+
+    Сортировка устойчивая: из правил с равными поддержкой и достоверностью остаются первые по порядку
+    в таблице, оставшиеся правила сохраняют исходный порядок.
+
+    Параметры:
+      - rules (pd.DataFrame): Правила с колонками "support" и "confidence".
+      - limit (int): Предел числа правил (0 — без ограничения).
+
+    Возвращаемое значение:
+      pd.DataFrame: Правила в пределах limit.
+    """
+    if not limit or len(rules) <= limit:
+        return rules
+    top = rules.sort_values(["support", "confidence"], ascending=False, kind="stable").head(limit)
+    return top.sort_index().reset_index(drop=True)
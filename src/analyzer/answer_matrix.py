@@ -0,0 +1,160 @@
+from array import array
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class AnswerMatrix:
+    """
+    Компактное представление анкет: разреженная матрица "анкета × код ответа" в формате CSR.
+
+    Каждая ячейка анкеты хранится как небольшое целое число — индекс кода ответа (первые три символа ячейки)
+    в словаре vocab. Текстовые дополнения ячеек (открытые ответы) вынесены в отдельную таблицу texts.
+    Порядок ячеек внутри анкеты сохраняется, поэтому обратное преобразование в список строк
+    дает посимвольно те же анкеты.
+
+    Атрибуты:
+      - indptr (np.ndarray): Границы анкет в массиве indices (длина — число анкет + 1).
+      - indices (np.ndarray): Индексы кодов ответов для всех ячеек подряд.
+      - vocab (np.ndarray): Словарь кодов ответов. Если матрица построена по схеме опросника, первые
+        known_count элементов совпадают с плоским пространством кодов схемы (Questionnaire.codes).
+      - texts (Dict[int, str]): Номер ячейки -> текстовое дополнение после кода.
+      - known_count (int): Количество кодов словаря, входящих в опросник.
+    """
+
+    def __init__(self, indptr, indices, vocab, texts=None, known_count=0):
+        self.indptr = indptr
+        self.indices = indices
+        self.vocab = vocab
+        self.texts = texts if texts is not None else {}
+        self.known_count = known_count
+
+    @classmethod
+    def from_rows(cls, rows, schema=None):
+        """
+        Кодирует анкеты за один проход по итератору строк.
+
+        Параметры:
+          - rows (Iterable[List[str]]): Анкеты, например список ответов или iter_answer_rows.
+          - schema (Questionnaire | None): Схема опросника. Если передана, коды опросника получают индексы
+            плоского пространства кодов схемы, а остальные коды добавляются в словарь после них.
+
+        Возвращаемое значение:
+          AnswerMatrix: Закодированные анкеты.
+        """
+        if schema is not None:
+            vocab = list(schema.codes)
+            code_to_id = dict(schema.code_to_index)
+        else:
+            vocab = []
+            code_to_id = {}
+        known_count = len(vocab)
+        indptr = array('q', [0])
+        indices = array('l')
+        texts = {}
+        for row in rows:
+            for cell in row:
+                code = cell[:3]
+                code_id = code_to_id.get(code)
+                if code_id is None:
+                    code_id = len(vocab)
+                    code_to_id[code] = code_id
+                    vocab.append(code)
+                if len(cell) > 3:
+                    texts[len(indices)] = cell[3:]
+                indices.append(code_id)
+            indptr.append(len(indices))
+        dtype = np.uint16 if len(vocab) <= np.iinfo(np.uint16).max else np.int32
+        return cls(np.frombuffer(indptr, dtype=np.int64).copy(), np.array(indices, dtype=dtype),
+                   np.array(vocab, dtype=str), texts, known_count)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def nbytes(self):
+        """
+        Объем памяти, занимаемый массивами матрицы (без учета таблицы текстов).
+        """
+        return self.indptr.nbytes + self.indices.nbytes + self.vocab.nbytes
+
+    def row(self, row_index):
+        """
+        Возвращает анкету с индексом row_index в виде списка строк.
+        """
+        start, end = int(self.indptr[row_index]), int(self.indptr[row_index + 1])
+        return [str(self.vocab[code_id]) + self.texts.get(start + offset, '')
+                for offset, code_id in enumerate(self.indices[start:end].tolist())]
+
+    def to_answers(self):
+        """
+        Преобразует матрицу обратно в список анкет (List[List[str]]).
+
+        Результат посимвольно совпадает с анкетами, из которых была построена матрица,
+        поэтому вывод save_answers не меняется.
+        """
+        cells = self.vocab[self.indices].tolist() if len(self.indices) else []
+        for cell_index, text in self.texts.items():
+            cells[cell_index] += text
+        bounds = self.indptr.tolist()
+        return [cells[bounds[idx]:bounds[idx + 1]] for idx in range(len(bounds) - 1)]
+
+    def row_ids(self):
+        """
+        Возвращает индекс анкеты для каждой ячейки (развернутый indptr).
+        """
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+
+    def to_csr(self, dtype=np.int32):
+        """
+        Возвращает scipy.sparse.csr_matrix размера (число анкет × размер словаря) с количеством вхождений кода в анкету.
+        """
+        data = np.ones(len(self.indices), dtype=dtype)
+        matrix = csr_matrix((data, self.indices.astype(np.int64), self.indptr), shape=(len(self), len(self.vocab)))
+        matrix.sum_duplicates()
+        return matrix
+
+    def question_counts(self, schema, dtype=np.int32):
+        """
+        Подсчитывает количество ответов каждой анкеты на каждый вопрос.
+
+        Параметры:
+          - schema (Questionnaire): Схема опросника, по которой построена матрица.
+          - dtype: Тип элементов результата.
+
+        Возвращаемое значение:
+          np.ndarray: Массив размера (число анкет × число вопросов); коды вне опросника не учитываются.
+        """
+        known = self.indices < self.known_count
+        questions = schema.code_question[self.indices[known]]
+        rows = self.row_ids()[known]
+        counts = np.bincount(rows * schema.questions_count + questions,
+                             minlength=len(self) * schema.questions_count)
+        return counts.reshape(len(self), schema.questions_count).astype(dtype)
+
+    def row_slice(self, start, end):
+        """
+        Возвращает матрицу из анкет с индексами [start, end) без копирования массива indices.
+        """
+        cell_start, cell_end = int(self.indptr[start]), int(self.indptr[end])
+        texts = {cell_index - cell_start: text for cell_index, text in self.texts.items()
+                 if cell_start <= cell_index < cell_end}
+        return AnswerMatrix(self.indptr[start:end + 1] - cell_start, self.indices[cell_start:cell_end], self.vocab,
+                            texts, self.known_count)
+
+    def take(self, row_indices):
+        """
+        Возвращает новую матрицу из анкет с указанными индексами (в заданном порядке).
+        """
+        row_indices = np.asarray(row_indices, dtype=np.int64)
+        starts = self.indptr[row_indices]
+        lengths = self.indptr[row_indices + 1] - starts
+        indptr = np.zeros(len(row_indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        cells = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1], dtype=np.int64)
+        texts = {}
+        if self.texts:
+            text_cells = np.fromiter(self.texts.keys(), dtype=np.int64, count=len(self.texts))
+            for new_index in np.flatnonzero(np.isin(cells, text_cells)).tolist():
+                texts[new_index] = self.texts[int(cells[new_index])]
+        return AnswerMatrix(indptr, self.indices[cells], self.vocab, texts, self.known_count)
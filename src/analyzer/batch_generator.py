@@ -0,0 +1,289 @@
+import numpy as np
+
+from .sampling import AliasTable
+
+
+class BatchGenerator:
+    """
+    Пакетная генерация анкет: тот же вероятностный процесс, что и в get_new_answers, но для тысяч анкет сразу.
+
+    Процесс генерации одной анкеты в get_new_answers:
+      1. Вопросы выбираются последовательно без возвращения с весами questionnaire_null.
+      2. Для вопроса выбирается количество ответов (probabilities_per_questions) и сами ответы без возвращения
+         с весами frequencies.
+      3. Если у вопроса есть сильно коррелирующие вопросы, для них генерируются ответы: первый еще не заполненный
+         вопрос — по правилам с предпосылкой первым выбранным ответом, остальные — по частотам. Для этих ответов
+         рекурсивно добавляются обязательные вопросы (кроме коррелирующих).
+
+    Здесь порядок вопросов задается экспоненциальными ключами (E / вес, что эквивалентно последовательному выбору
+    без возвращения), количество ответов — таблицами псевдонимов (SamplingTables), ответы без
+    возвращения — наименьшими экспоненциальными ключами E / вес. Анкеты обрабатываются группами: на каждом шаге
+    порядка вопросов — все анкеты с одинаковым текущим вопросом, обязательные вопросы — обходом в ширину
+    по уровням. Порядок заполнения не влияет на распределение результата, так как ответы на каждый вопрос
+    выбираются независимо от того, каким путем вопрос был достигнут.
+
+    Если переданы constraints (GenerationConstraints), анкеты генерируются корректными по условиям проверки:
+    количество ответов выбирается в пределах [минимум, максимум] вопроса, коды, несовместимые с уже выбранными,
+    исключаются из выбора, после генерации дополняются обязательные вопросы и вопросы с недостающим количеством
+    ответов. Анкеты, которые так и не удалось сделать корректными, отбрасываются.
+
+    Выбранные ответы хранятся булевой матрицей (анкеты × плоское пространство кодов схемы).
+    """
+
+    def __init__(self, schema, sampling_tables, generation_index, conditions, constraints=None):
+        self.schema = schema
+        self.constraints = constraints
+        self.codes = np.array(schema.codes)
+        self.offsets = schema.question_offsets.tolist()
+        questions_count = schema.questions_count
+        self.question_weights = np.array([generation_index.questionnaire_null[i] for i in range(questions_count)],
+                                         dtype=np.float64)
+        self.count_tables = sampling_tables.count_tables
+        self.required_count_tables = None
+        if constraints is not None:
+            self.count_tables = [self.truncate_counts(table, constraints.min_answers[i], constraints.max_answers[i])
+                                 for i, table in enumerate(sampling_tables.count_tables)]
+            self.required_count_tables = [
+                self.truncate_counts(table, max(1, constraints.min_answers[i]), constraints.max_answers[i])
+                for i, table in enumerate(sampling_tables.count_tables)]
+        self.code_weights = [table.weights for table in sampling_tables.code_tables]
+        self.adjacency = {question: [int(adjacent) for adjacent in adjacent_questions]
+                          for question, adjacent_questions in generation_index.adjacency.items()}
+        self.adjacency_mask = np.zeros((questions_count, questions_count), dtype=bool)
+        for question, adjacent_questions in self.adjacency.items():
+            self.adjacency_mask[question, adjacent_questions] = True
+        self.required_matrix = np.zeros((len(schema.codes), questions_count), dtype=np.float32)
+        for position, code in enumerate(schema.codes):
+            self.required_matrix[position, conditions.required_questions.get(code, [])] = 1
+        self.rule_answers = {}
+        for antecedent, questions_rules in generation_index.rule_answers.items():
+            if antecedent not in schema.code_to_index:
+                continue
+            self.rule_answers[schema.code_to_index[antecedent]] = {
+                question: (np.array([schema.code_to_index[code] for code in rule_table.values.tolist()],
+                                    dtype=np.int64), rule_table.weights)
+                for question, rule_table in questions_rules.items()}
+
+    @staticmethod
+    def truncate_counts(table, min_count, max_count):
+        """
+        Ограничивает распределение количества ответов отрезком [min_count, max_count] (условное распределение).
+
+        Если вероятность отрезка нулевая, всегда выбирается ближайшее допустимое значение.
+        """
+        values = table.values.astype(np.int64)
+        allowed = (values >= min_count) & (values <= max_count) & (table.weights > 0)
+        if allowed.any():
+            return AliasTable(values[allowed], table.weights[allowed])
+        return AliasTable([min(min_count, max_count)], [1.0])
+
+    def draw_counts(self, question_index, size, rng, count_tables=None):
+        """
+        Выбирает количество ответов на вопрос для size анкет по таблице псевдонимов вопроса.
+        """
+        table = (count_tables or self.count_tables)[question_index]
+        return table.values[table.draw_indices(size, rng)].astype(np.int64)
+
+    @staticmethod
+    def draw_without_replacement(weights, counts, rng):
+        """
+        Выбирает для каждой строки counts[r] элементов без возвращения с весами weights.
+
+        Элементы с наименьшими ключами E / вес (E ~ Exp(1)) образуют выборку того же распределения,
+        что и последовательный выбор без возвращения (np.random.choice(replace=False, p=...)).
+
+        Возвращаемое значение:
+          Tuple[np.ndarray, np.ndarray]: Булева матрица выбранных элементов (строки × элементы)
+          и индекс элемента, выбранного первым, для каждой строки.
+        """
+        size = len(counts)
+        counts = np.minimum(counts, np.count_nonzero(weights))
+        with np.errstate(divide='ignore'):
+            keys = rng.exponential(size=(size, len(weights))) / weights
+        order = np.argsort(keys, axis=1)
+        chosen = np.zeros((size, len(weights)), dtype=bool)
+        np.put_along_axis(chosen, order, np.arange(len(weights))[None, :] < counts[:, None], axis=1)
+        return chosen, order[:, 0]
+
+    def choose(self, weights, positions, rows, counts, selected, blocked, rng):
+        """
+        Выбирает для анкет rows по counts[r] кодов из позиций positions без возвращения с весами weights.
+
+        Без условий (blocked is None) — draw_without_replacement. С условиями из выбора исключаются уже выбранные
+        коды и коды, несовместимые с выбранными ранее (blocked); если среди самих positions есть несовместимые
+        коды, они выбираются по очереди в порядке ключей. Позиции, несовместимые с выбранными кодами,
+        добавляются в blocked.
+
+        Возвращаемое значение:
+          Tuple[np.ndarray, np.ndarray]: Булева матрица выбранных кодов (анкеты × positions)
+          и индекс в positions кода, выбранного первым.
+        """
+        if blocked is None:
+            return self.draw_without_replacement(weights, counts, rng)
+        available = ~(blocked[rows][:, positions] | selected[rows][:, positions]) & (weights > 0)[None, :]
+        counts = np.minimum(counts, available.sum(axis=1))
+        with np.errstate(divide='ignore'):
+            keys = rng.exponential(size=available.shape) / weights
+        keys[~available] = np.inf
+        order = np.argsort(keys, axis=1)
+        chosen = np.zeros(available.shape, dtype=bool)
+        local_conflicts = self.constraints.conflicts[np.ix_(positions, positions)]
+        if local_conflicts.any():
+            row_range = np.arange(len(rows))
+            taken = np.zeros(len(rows), dtype=np.int64)
+            for rank in range(len(positions)):
+                candidates = order[:, rank]
+                conflicting = (chosen.astype(np.float32) @ local_conflicts)[row_range, candidates] > 0
+                accepted = (taken < counts) & available[row_range, candidates] & ~conflicting
+                chosen[row_range[accepted], candidates[accepted]] = True
+                taken += accepted
+        else:
+            np.put_along_axis(chosen, order, np.arange(len(positions))[None, :] < counts[:, None], axis=1)
+        blocked[rows] |= (chosen.astype(np.float32) @ self.constraints.conflicts[positions]) > 0
+        return chosen, order[:, 0]
+
+    def draw_question(self, question_index, rows, selected, blocked, rng, counts=None):
+        """
+        Выбирает ответы на вопрос по частотам для анкет rows (количество ответов — counts или из распределения).
+
+        Возвращаемое значение:
+          Tuple[np.ndarray, np.ndarray]: Выбранные коды вопроса (анкеты × коды вопроса)
+          и позиция первого выбранного ответа в плоском пространстве кодов.
+        """
+        if counts is None:
+            counts = self.draw_counts(question_index, len(rows), rng)
+        start, end = self.offsets[question_index], self.offsets[question_index + 1]
+        chosen, first = self.choose(self.code_weights[question_index], np.arange(start, end), rows, counts,
+                                    selected, blocked, rng)
+        return chosen, first + start
+
+    def sample(self, size, rng):
+        """
+        Генерирует size анкет (с условиями — только корректные из них, поэтому анкет может быть меньше).
+
+        Возвращаемое значение:
+          np.ndarray: Булева матрица выбранных ответов (анкеты × число кодов схемы).
+        """
+        questions_count = self.schema.questions_count
+        selected = np.zeros((size, len(self.codes)), dtype=bool)
+        present = np.ones((size, questions_count), dtype=bool)
+        blocked = None
+        if self.constraints is not None:
+            blocked = np.tile(self.constraints.blocked_positions, (size, 1))
+        with np.errstate(divide='ignore'):
+            question_order = np.argsort(rng.exponential(size=(size, questions_count)) / self.question_weights,
+                                        axis=1)
+        all_rows = np.arange(size)
+        for step in range(questions_count):
+            step_questions = question_order[:, step]
+            active = present[all_rows, step_questions]
+            for question_index in np.unique(step_questions[active]).tolist():
+                rows = np.flatnonzero(active & (step_questions == question_index))
+                present[rows, question_index] = False
+                chosen, first = self.draw_question(question_index, rows, selected, blocked, rng)
+                start, end = self.offsets[question_index], self.offsets[question_index + 1]
+                selected[rows, start:end] |= chosen
+                if question_index in self.adjacency:
+                    has_answers = chosen.any(axis=1)
+                    self.expand_adjacency(selected, present, blocked, rows[has_answers], first[has_answers],
+                                          question_index, rng)
+        if self.constraints is None:
+            return selected
+        self.complete_rows(selected, blocked, rng)
+        return selected[self.constraints.valid_rows(selected)]
+
+    def expand_adjacency(self, selected, present, blocked, rows, first_positions, question_index, rng):
+        """
+        Генерирует ответы на вопросы, сильно коррелирующие с question_index, и добавляет обязательные вопросы.
+
+        Первый еще не заполненный коррелирующий вопрос анкеты заполняется по правилам с предпосылкой
+        first_positions (если такие правила есть), остальные — по частотам.
+        """
+        if not len(rows):
+            return
+        rules_used = np.zeros(len(rows), dtype=bool)
+        new_selected = np.zeros((len(rows), len(self.codes)), dtype=bool)
+        for adjacent_question in self.adjacency[question_index]:
+            eligible = present[rows, adjacent_question]
+            if not eligible.any():
+                continue
+            start, end = self.offsets[adjacent_question], self.offsets[adjacent_question + 1]
+            frequency_rows = eligible & rules_used
+            for first_position in np.unique(first_positions[eligible & ~rules_used]).tolist():
+                group = np.flatnonzero(eligible & ~rules_used & (first_positions == first_position))
+                rule = self.rule_answers.get(first_position, {}).get(adjacent_question)
+                if rule is None:
+                    frequency_rows[group] = True
+                    continue
+                consequents, confidences = rule
+                counts = np.minimum(self.draw_counts(adjacent_question, len(group), rng), len(consequents))
+                chosen, _ = self.choose(confidences, consequents, rows[group], counts, selected, blocked, rng)
+                group_rows, consequent_indices = np.nonzero(chosen)
+                new_selected[group[group_rows], consequents[consequent_indices]] = True
+                selected[rows[group[group_rows]], consequents[consequent_indices]] = True
+            group = np.flatnonzero(frequency_rows)
+            if len(group):
+                chosen, _ = self.draw_question(adjacent_question, rows[group], selected, blocked, rng)
+                new_selected[group, start:end] |= chosen
+                selected[rows[group], start:end] |= chosen
+            rules_used |= eligible
+            present[rows[eligible], adjacent_question] = False
+        self.expand_required(selected, present, blocked, rows, new_selected, self.adjacency_mask[question_index],
+                             rng)
+
+    def expand_required(self, selected, present, blocked, rows, frontier, blocked_questions, rng):
+        """
+        Добавляет ответы на обязательные вопросы для ответов frontier обходом в ширину
+        (вопросы blocked_questions и уже заполненные вопросы пропускаются).
+        """
+        while True:
+            required = (frontier.astype(np.float32) @ self.required_matrix) > 0
+            pending = required & present[rows] & ~blocked_questions[None, :]
+            if not pending.any():
+                return
+            frontier = np.zeros_like(frontier)
+            for question_index in np.flatnonzero(pending.any(axis=0)).tolist():
+                local_rows = np.flatnonzero(pending[:, question_index])
+                chosen, _ = self.draw_question(question_index, rows[local_rows], selected, blocked, rng)
+                start, end = self.offsets[question_index], self.offsets[question_index + 1]
+                frontier[local_rows, start:end] = chosen
+                selected[rows[local_rows], start:end] |= chosen
+                present[rows[local_rows], question_index] = False
+
+    def complete_rows(self, selected, blocked, rng):
+        """
+        Дополняет анкеты до выполнения условий: вопросы, обязательные для выбранных ответов (или игнорируемых кодов),
+        но оставшиеся без ответов, и вопросы с количеством ответов меньше минимального.
+
+        Обязательный вопрос без ответов получает количество ответов из распределения вопроса, ограниченного
+        снизу единицей; добавленные ответы могут сделать обязательными другие вопросы, поэтому проход
+        повторяется (не более чем по числу вопросов).
+        """
+        constraints = self.constraints
+        for _ in range(self.schema.questions_count + 1):
+            counts = constraints.question_counts(selected)
+            missing = constraints.missing_required(selected, counts)
+            needed = missing | (counts < constraints.min_answers[None, :])
+            if not needed.any():
+                return
+            for question_index in np.flatnonzero(needed.any(axis=0)).tolist():
+                rows = np.flatnonzero(needed[:, question_index])
+                current = counts[rows, question_index]
+                target = np.maximum(current, constraints.min_answers[question_index])
+                is_missing = missing[rows, question_index]
+                if is_missing.any():
+                    target[is_missing] = np.maximum(
+                        target[is_missing],
+                        self.draw_counts(question_index, int(is_missing.sum()), rng, self.required_count_tables))
+                chosen, _ = self.draw_question(question_index, rows, selected, blocked, rng, target - current)
+                start, end = self.offsets[question_index], self.offsets[question_index + 1]
+                selected[rows, start:end] |= chosen
+
+    def to_answers(self, selected, ignored_codes):
+        """
+        Преобразует матрицу выбранных ответов в список анкет (отсортированные коды с игнорируемыми кодами).
+        """
+        row_indices, positions = np.nonzero(selected)
+        bounds = np.searchsorted(row_indices, np.arange(len(selected) + 1))
+        codes = self.codes[positions].tolist()
+        return [sorted(codes[bounds[idx]:bounds[idx + 1]] + list(ignored_codes)) for idx in range(len(selected))]
@@ -0,0 +1,184 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+
+from .answer_matrix import AnswerMatrix
+from .data_parser import find_answer_files
+
+logger = logging.getLogger(__name__)
+
+SURVEY_CACHE_DIR = "cache/survey"
+SURVEY_INPUTS_PATH = "cache/survey_inputs.json"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def survey_input_files(data_dir, question_data_ext, answer_data_ext, conditions_ext):
+    """
+    Возвращает список входных файлов опроса в том порядке, в котором их читают парсеры.
+
+    Процесс включает:
+      1. Выбор файла опросника и файла условий (первый найденный, как в parse_question_data и parse_conditions_data).
+      2. Поиск файлов ответов через find_answer_files.
+
+    Параметры:
+      - data_dir (str): Путь к директории с данными.
+      - question_data_ext (str): Расширение файла опросника.
+      - answer_data_ext (List[str]): Расширения файлов ответов.
+      - conditions_ext (str): Расширение файла условий.
+
+    Возвращаемое значение:
+      - List[str]: Пути к входным файлам.
+
+    Исключения:
+      - FileNotFoundError: Если директория отсутствует.
+    """
+    filenames = []
+    for ext in (question_data_ext, conditions_ext):
+        filenames.extend(glob.glob(data_dir + "/*" + ext)[:1])
+    filenames.extend(find_answer_files(data_dir, answer_data_ext))
+    return filenames
+
+
+def hash_input_files(filenames):
+    """
+    Вычисляет хэш содержимого входных файлов, читая их блоками.
+
+    В хэш входят имена файлов, их размеры и содержимое, поэтому переименование, добавление
+    или изменение любого файла инвалидирует кэш.
+
+    Параметры:
+      - filenames (List[str]): Пути к файлам.
+
+    Возвращаемое значение:
+      - str: Шестнадцатеричная строка хэша.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for filename in filenames:
+        digest.update(os.path.basename(filename).encode('utf-8'))
+        digest.update(str(os.path.getsize(filename)).encode('utf-8'))
+        with open(filename, 'rb') as file:
+            while True:
+                block = file.read(HASH_BLOCK_SIZE)
+                if not block:
+                    break
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def input_files_key(filenames, inputs_path=SURVEY_INPUTS_PATH):
+    """
+    Возвращает ключ кэша входных файлов, читая их содержимое только при изменении файлов.
+
+    Процесс включает:
+      1. Сравнение путей, размеров и времени изменения (mtime_ns) файлов с сохраненными в inputs_path.
+      2. При совпадении — возврат сохраненного ключа без чтения файлов.
+      3. Иначе — вычисление хэша содержимого (hash_input_files) и сохранение его вместе с параметрами файлов.
+
+    Параметры:
+      - filenames (List[str]): Пути к файлам.
+      - inputs_path (str): Путь к файлу с параметрами файлов и ключом последнего вычисления.
+
+    Возвращаемое значение:
+      - str: Шестнадцатеричная строка хэша (см. hash_input_files).
+    """
+    files = []
+    for filename in filenames:
+        stat = os.stat(filename)
+        files.append([os.path.abspath(filename), stat.st_size, stat.st_mtime_ns])
+    try:
+        with open(inputs_path, 'r', encoding='utf-8') as f:
+            inputs = json.load(f)
+        if isinstance(inputs, dict) and inputs.get("files") == files and inputs.get("key"):
+            return inputs["key"]
+    except (OSError, ValueError):
+        pass
+    cache_key = hash_input_files(filenames)
+    try:
+        os.makedirs(os.path.dirname(inputs_path) or ".", exist_ok=True)
+        with open(inputs_path, 'w', encoding='utf-8') as f:
+            json.dump({"files": files, "key": cache_key}, f, ensure_ascii=False)
+    except OSError as e:
+        logger.info(f"Не удалось сохранить параметры входных файлов: {e}")
+    return cache_key
+
+
+def save_survey_cache(cache_key, code_to_text, questions, conditions, matrix, cache_dir=SURVEY_CACHE_DIR):
+    """
+    Сохраняет разобранные входные данные опроса в бинарный кэш.
+
+    Процесс включает:
+      1. Удаление кэшей, построенных по другим входным файлам.
+      2. Сохранение опросника и условий проверки в meta.json.
+      3. Сохранение матрицы ответов (AnswerMatrix) в отдельные .npy-файлы, пригодные для отображения в память.
+
+    Параметры:
+      - cache_key (str): Хэш входных файлов (см. hash_input_files).
+      - code_to_text (Dict[str, str]): Словарь соответствий кодов ответов и их текстовых описаний.
+      - questions (Dict[str, List[Tuple[str, str]]]): Словарь вопросов.
+      - conditions (Tuple[List[int], Dict, Dict, List[int]]): Результат parse_conditions_data.
+      - matrix (AnswerMatrix): Анкеты, закодированные по схеме опросника (AnswerMatrix.from_rows с schema).
+      - cache_dir (str): Каталог кэша.
+    """
+    if os.path.exists(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name != cache_key:
+                shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+    path = os.path.join(cache_dir, cache_key)
+    os.makedirs(path, exist_ok=True)
+    question_max_answers, question_exception_answers, question_required_answers, question_min_answers = conditions
+    meta = {"code_to_text": code_to_text, "questions": list(questions.items()),
+            "question_max_answers": question_max_answers, "question_exception_answers": question_exception_answers,
+            "question_required_answers": question_required_answers, "question_min_answers": question_min_answers,
+            "known_count": matrix.known_count}
+    arrays = {"indptr": matrix.indptr, "indices": matrix.indices, "vocab": matrix.vocab,
+              "text_cells": np.fromiter(matrix.texts.keys(), dtype=np.int64, count=len(matrix.texts)),
+              "text_values": np.array(list(matrix.texts.values()), dtype=str)}
+    for name, array in arrays.items():
+        np.save(os.path.join(path, name + ".npy"), array, allow_pickle=False)
+    with open(os.path.join(path, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    logger.info(f"Входные данные сохранены в кэш {path}.")
+
+
+def load_survey_cache(cache_key, cache_dir=SURVEY_CACHE_DIR):
+    """
+    Загружает разобранные входные данные опроса из бинарного кэша.
+
+    Массивы ответов открываются через np.load(mmap_mode='r') и возвращаются в виде AnswerMatrix без
+    преобразования в списки строк: текстовые файлы не читаются и не разбираются повторно, а проверка
+    и подсчет частот (validate_answer_matrix, FrequencyModel.add_matrix) работают с матрицей напрямую.
+
+    Параметры:
+      - cache_key (str): Хэш входных файлов (см. hash_input_files).
+      - cache_dir (str): Каталог кэша.
+
+    Возвращаемое значение:
+      Tuple[Dict[str, str], Dict[str, List[Tuple[str, str]]], Tuple[List[int], Dict, Dict, List[int]], AnswerMatrix] | None:
+        code_to_text, questions, conditions и матрица анкет, закодированная по схеме опросника, либо None,
+        если кэш для этих входных файлов отсутствует или создан в прежнем формате.
+    """
+    path = os.path.join(cache_dir, cache_key)
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if "known_count" not in meta:
+            return None
+        arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode='r', allow_pickle=False)
+                  for name in ("indptr", "indices", "vocab", "text_cells", "text_values")}
+    except (OSError, ValueError) as e:
+        logger.info(f"Не удалось прочитать кэш {path}: {e}")
+        return None
+    questions = {question: [tuple(option) for option in options] for question, options in meta["questions"]}
+    conditions = (meta["question_max_answers"], meta["question_exception_answers"],
+                  meta["question_required_answers"], meta["question_min_answers"])
+    texts = dict(zip(arrays["text_cells"].tolist(), arrays["text_values"].tolist()))
+    matrix = AnswerMatrix(arrays["indptr"], arrays["indices"], arrays["vocab"], texts, meta["known_count"])
+    return meta["code_to_text"], questions, conditions, matrix
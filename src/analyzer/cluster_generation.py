@@ -0,0 +1,255 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Barrier
+
+import numpy as np
+
+from .analitics import get_strong_pairs, get_rules
+from .generation_index import compile_generation_index
+from .generator import get_new_answers, get_new_answers_batch
+from .processor import get_frequencies, get_probabilities_per_questions, log_with_print
+from .report import save_df
+from .sampling import compile_sampling_tables
+
+# данные генерации, переданные процессу пула один раз при запуске (см. compile_generation_pool)
+shared_state = None
+
+
+class ClusterModel:
+    """
+    Модель кластера для генерации анкет: строится один раз по анкетам кластера и используется
+    на всех проходах генерации.
+
+    Атрибуты:
+      - cluster_index (int): Номер кластера (с нуля).
+      - generation_index (GenerationIndex): Сильные пары и ассоциативные правила кластера.
+      - sampling_tables (SamplingTables): Таблицы выбора количества ответов и кодов (частоты ответов кластера).
+    """
+
+    def __init__(self, cluster_index, generation_index, sampling_tables):
+        self.cluster_index = cluster_index
+        self.generation_index = generation_index
+        self.sampling_tables = sampling_tables
+
+
+def compile_cluster_model(cluster_index, cluster_answers, df_code_cluster, schema, questions, question_max_answers,
+                          config):
+    """
+    Строит модель одного кластера.
+
+    Процесс включает:
+      1. Поиск сильных пар вопросов и ассоциативных правил кластера, сохранение отчетов (save_df).
+      2. Расчет вероятностей количества ответов и частот ответов кластера, построение таблиц выбора
+         и поисковых структур генерации.
+
+    Параметры:
+      - cluster_index (int): Номер кластера (с нуля).
+      - cluster_answers (List[List[str]]): Анкеты кластера без игнорируемых кодов.
+      - df_code_cluster (pd.DataFrame): Ответы кластера по вопросам (см. parse_answers_to_questions).
+      - schema (Questionnaire): Скомпилированная схема опросника.
+      - questions (Dict): Вопросы опросника (см. parse_question_data).
+      - question_max_answers (List[int]): Максимальное количество ответов на каждый вопрос.
+      - config (Dict): Параметры конфигурации (см. load_config).
+
+    Возвращаемое значение:
+      ClusterModel: Модель кластера.
+    """
+    strong_pairs_index = get_strong_pairs(cluster_answers, config["ignored_codes"], schema.possible_answers_list,
+                                          questions, config["strong_pairs_coefficient"], config["correlation_engine"],
+                                          config["correlation_dtype"])
+    rules = get_rules(cluster_answers, config["rule_miner"], config["max_rules"], config["rules_memory_budget_mb"])
+    save_df(cluster_index, strong_pairs_index, rules)
+    log_with_print(f"Сгенерированы отчеты для кластера {cluster_index + 1}.")
+    probabilities_per_questions = get_probabilities_per_questions(df_code_cluster, question_max_answers)
+    sampling_tables = compile_sampling_tables(schema, get_frequencies(cluster_answers, schema, config["static_error"]),
+                                              probabilities_per_questions)
+    return ClusterModel(cluster_index, compile_generation_index(schema, strong_pairs_index, rules), sampling_tables)
+
+
+def compile_cluster_models(clusters_answers, df_code_clusters, schema, questions, question_max_answers, config,
+                           workers=1):
+    """
+    Строит модели всех кластеров, при workers > 1 — параллельно в пуле процессов.
+
+    Параметры:
+      - clusters_answers (List[List[List[str]]]): Анкеты каждого кластера.
+      - df_code_clusters (List[pd.DataFrame]): Ответы каждого кластера по вопросам.
+      - workers (int): Количество процессов (1 — последовательно в текущем процессе).
+      - остальные параметры совпадают с compile_cluster_model.
+
+    Возвращаемое значение:
+      List[ClusterModel]: Модели кластеров в порядке кластеров.
+    """
+    clusters_count = len(clusters_answers)
+    arguments = (range(clusters_count), clusters_answers, df_code_clusters, [schema] * clusters_count,
+                 [questions] * clusters_count, [question_max_answers] * clusters_count, [config] * clusters_count)
+    if workers > 1 and clusters_count > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, clusters_count)) as executor:
+            return list(executor.map(compile_cluster_model, *arguments))
+    return list(map(compile_cluster_model, *arguments))
+
+
+def generate_cluster(cluster_model, new_answers_count, schema, conditions, config, seed_sequence, constraints=None,
+                     fingerprints=None):
+    """
+    Генерирует новые анкеты для одного кластера по его модели.
+
+    Анкеты генерируются в режиме generation_mode с генератором случайных чисел, созданным из seed_sequence
+    (при переданных constraints — пакетная генерация корректных по условиям проверки анкет).
+    При переданных fingerprints анкеты, совпадающие с уже имеющимися, генерируются заново.
+
+    Кластеры не зависят друг от друга, поэтому функция может выполняться в отдельном процессе;
+    результат определяется только входными данными и seed_sequence.
+
+    Параметры:
+      - cluster_model (ClusterModel): Модель кластера (см. compile_cluster_model).
+      - new_answers_count (int): Количество анкет для генерации.
+      - schema (Questionnaire): Скомпилированная схема опросника.
+      - conditions (ConditionRules): Скомпилированные исключающие и обязательные условия.
+      - config (Dict): Параметры конфигурации (см. load_config).
+      - seed_sequence (np.random.SeedSequence): Начальное значение генератора случайных чисел кластера.
+      - constraints (GenerationConstraints | None): Условия проверки для генерации корректных анкет.
+      - fingerprints (FingerprintSet | BloomFilter | None): Отпечатки имеющихся анкет. Фильтр только читается,
+        поэтому результат кластера не зависит от других кластеров и количества процессов.
+
+    Возвращаемое значение:
+      List[List[str]]: Сгенерированные анкеты кластера.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    if config["generation_mode"] == "batch" or constraints is not None:
+        return get_new_answers_batch(schema, cluster_model.sampling_tables, cluster_model.generation_index,
+                                     new_answers_count, config["ignored_codes"], conditions,
+                                     config["generation_batch_size"], rng, constraints, fingerprints)
+    return get_new_answers(schema, cluster_model.sampling_tables, cluster_model.generation_index, new_answers_count,
+                           config["ignored_codes"], conditions, rng, fingerprints)
+
+
+class GenerationPool:
+    """
+    Пул процессов для генерации анкет кластеров, создаваемый один раз на запуск.
+
+    Модели кластеров, схема, условия, конфигурация и фильтр отпечатков передаются каждому процессу один раз
+    при запуске, поэтому задачи проходов содержат только номер кластера, количество анкет и начальное значение
+    генератора. Между проходами в процессы рассылаются только отпечатки новых зафиксированных анкет (update),
+    поэтому фильтр процессов совпадает с фильтром основного процесса и результат не зависит от пула.
+
+    Атрибуты:
+      - workers (int): Количество процессов.
+      - executor (ProcessPoolExecutor): Пул процессов.
+    """
+
+    def __init__(self, workers, executor):
+        self.workers = workers
+        self.executor = executor
+
+    def update(self, new_fingerprints):
+        """
+        Добавляет отпечатки new_fingerprints в фильтры всех процессов пула.
+
+        Рассылается по одной задаче на процесс: задачи ждут друг друга на барьере, поэтому ни один процесс
+        не получает две задачи рассылки.
+        """
+        list(self.executor.map(update_shared_fingerprints, [new_fingerprints] * self.workers))
+
+    def generate(self, new_answers_counts, seed_sequences):
+        """
+        Генерирует анкеты для всех кластеров (см. generate_clusters).
+
+        Возвращаемое значение:
+          List[List[List[str]]]: Сгенерированные анкеты каждого кластера.
+        """
+        return list(self.executor.map(generate_shared_cluster, range(len(new_answers_counts)), new_answers_counts,
+                                      seed_sequences))
+
+    def close(self):
+        """
+        Завершает процессы пула.
+        """
+        self.executor.shutdown()
+
+
+def compile_generation_pool(cluster_models, schema, conditions, config, workers, constraints=None,
+                            fingerprints=None):
+    """
+    Создает пул процессов генерации и запускает все его процессы.
+
+    Параметры:
+      - cluster_models (List[ClusterModel]): Модели кластеров (см. compile_cluster_models).
+      - workers (int): Количество процессов (не больше количества кластеров).
+      - fingerprints (FingerprintSet | BloomFilter | None): Фильтр отпечатков имеющихся анкет; процессы получают
+        его копию, которая затем пополняется через GenerationPool.update.
+      - остальные параметры совпадают с generate_cluster.
+
+    Возвращаемое значение:
+      GenerationPool: Пул процессов генерации.
+    """
+    workers = min(workers, len(cluster_models))
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=share_generation_state,
+                                   initargs=(cluster_models, schema, conditions, config, constraints, fingerprints,
+                                             Barrier(workers)))
+    generation_pool = GenerationPool(workers, executor)
+    # пустая рассылка запускает сразу все процессы, чтобы следующие рассылки застали каждый из них
+    generation_pool.update([])
+    return generation_pool
+
+
+def share_generation_state(cluster_models, schema, conditions, config, constraints, fingerprints, barrier):
+    """
+    Сохраняет данные генерации в процессе пула (initializer ProcessPoolExecutor).
+    """
+    global shared_state
+    shared_state = {"cluster_models": cluster_models, "schema": schema, "conditions": conditions, "config": config,
+                    "constraints": constraints, "fingerprints": fingerprints, "barrier": barrier}
+
+
+def update_shared_fingerprints(new_fingerprints):
+    """
+    Добавляет отпечатки в фильтр процесса пула и ждет остальные процессы (см. GenerationPool.update).
+    """
+    if shared_state["fingerprints"] is not None:
+        for fingerprint in new_fingerprints:
+            shared_state["fingerprints"].add(fingerprint)
+    shared_state["barrier"].wait()
+
+
+def generate_shared_cluster(cluster_index, new_answers_count, seed_sequence):
+    """
+    Вызывает generate_cluster с данными, сохраненными в процессе пула через share_generation_state.
+    """
+    return generate_cluster(shared_state["cluster_models"][cluster_index], new_answers_count, shared_state["schema"],
+                            shared_state["conditions"], shared_state["config"], seed_sequence,
+                            shared_state["constraints"], shared_state["fingerprints"])
+
+
+def generate_clusters(cluster_models, new_answers_counts, schema, conditions, config, seed_sequences, workers=1,
+                      constraints=None, fingerprints=None):
+    """
+    Генерирует анкеты для всех кластеров, при workers > 1 — параллельно в пуле процессов.
+
+    Каждый кластер получает собственный генератор случайных чисел из seed_sequences (SeedSequence.spawn),
+    поэтому результаты не зависят от количества процессов и порядка их завершения и возвращаются
+    в порядке кластеров. При workers > 1 создается временный пул (compile_generation_pool); чтобы не создавать
+    пул на каждом проходе, используйте GenerationPool.generate.
+
+    Параметры:
+      - cluster_models (List[ClusterModel]): Модели кластеров (см. compile_cluster_models).
+      - new_answers_counts (List[int]): Количество анкет для генерации в каждом кластере.
+      - seed_sequences (List[np.random.SeedSequence]): Начальные значения генераторов кластеров.
+      - workers (int): Количество процессов (1 — последовательная генерация в текущем процессе).
+      - constraints (GenerationConstraints | None): Условия проверки для генерации корректных анкет.
+      - fingerprints (FingerprintSet | BloomFilter | None): Отпечатки имеющихся анкет (см. compile_fingerprint_filter).
+      - остальные параметры совпадают с generate_cluster.
+
+    Возвращаемое значение:
+      List[List[List[str]]]: Сгенерированные анкеты каждого кластера.
+    """
+    clusters_count = len(cluster_models)
+    if workers > 1 and clusters_count > 1:
+        generation_pool = compile_generation_pool(cluster_models, schema, conditions, config, workers, constraints,
+                                                  fingerprints)
+        try:
+            return generation_pool.generate(new_answers_counts, seed_sequences)
+        finally:
+            generation_pool.close()
+    return list(map(generate_cluster, cluster_models, new_answers_counts, [schema] * clusters_count,
+                    [conditions] * clusters_count, [config] * clusters_count, seed_sequences,
+                    [constraints] * clusters_count, [fingerprints] * clusters_count))
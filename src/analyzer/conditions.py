@@ -0,0 +1,149 @@
+class ConditionRules:
+    """
+    Скомпилированные исключающие и обязательные условия проверки (.cnf) в виде битовых масок.
+
+    Каждой позиции плоского пространства кодов схемы (Questionnaire.codes) соответствует один бит;
+    коды из условий, отсутствующие в опроснике, получают биты после них. Анкета кодируется
+    одним целым числом (row_mask), после чего проверка условий сводится к операциям AND и подсчету битов.
+    Вопросы, целиком входящие в список исключенных или требуемых кодов, определяются один раз при компиляции.
+
+    Атрибуты:
+      - schema (Questionnaire): Скомпилированная схема опросника.
+      - exception_answers (Dict[str, List[str]]): Исходные исключающие условия.
+      - required_answers (Dict[str, List[str]]): Исходные обязательные условия.
+      - code_masks (Dict[str, int]): Код ответа -> биты всех его позиций.
+      - question_masks (List[int]): Биты кодов каждого вопроса.
+      - exception_masks (Dict[str, int]): Код ответа -> биты исключенных им кодов.
+      - exception_questions (Dict[str, List[int]]): Код ответа -> вопросы, все ответы которых он исключает.
+      - exception_questions_masks (Dict[str, int]): Код ответа -> объединение масок exception_questions.
+      - required_questions (Dict[str, List[int]]): Код ответа -> вопросы, на которые обязателен ответ.
+      - required_graph (List[List[int]]): Вопрос -> вопросы, обязательные хотя бы для одного из его кодов.
+      - required_cycles (List[List[int]]): Группы вопросов, обязательные условия которых замыкаются в цикл.
+    """
+
+    def __init__(self, schema, question_exception_answers, question_required_answers):
+        self.schema = schema
+        self.exception_answers = question_exception_answers
+        self.required_answers = question_required_answers
+        self.code_masks = {}
+        for position, code in enumerate(schema.codes):
+            self.code_masks[code] = self.code_masks.get(code, 0) | (1 << position)
+        bit = len(schema.codes)
+        for conditions in (question_exception_answers, question_required_answers):
+            for code, condition_answers in conditions.items():
+                for condition_code in [code] + condition_answers:
+                    if condition_code not in self.code_masks:
+                        self.code_masks[condition_code] = 1 << bit
+                        bit += 1
+        self.question_masks = []
+        for question_index in range(schema.questions_count):
+            start, end = schema.question_range(question_index)
+            self.question_masks.append(((1 << end) - 1) ^ ((1 << start) - 1))
+        self.exception_masks = {}
+        self.exception_questions = {}
+        self.exception_questions_masks = {}
+        for code, exception_answers in question_exception_answers.items():
+            mask = 0
+            for exception_answer in exception_answers:
+                mask |= self.code_masks[exception_answer]
+            self.exception_masks[code] = mask
+            self.exception_questions[code] = self._covered_questions(exception_answers)
+            self.exception_questions_masks[code] = 0
+            for question_index in self.exception_questions[code]:
+                self.exception_questions_masks[code] |= self.question_masks[question_index]
+        self.required_questions = {code: self._covered_questions(required_answers)
+                                   for code, required_answers in question_required_answers.items()}
+        self.required_graph = [[] for _ in range(schema.questions_count)]
+        for position, code in enumerate(schema.codes):
+            question_edges = self.required_graph[schema.code_question[position]]
+            for required_question in self.required_questions.get(code, ()):
+                if required_question not in question_edges:
+                    question_edges.append(required_question)
+        self.required_cycles = self._find_required_cycles()
+
+    def _covered_questions(self, condition_answers):
+        """
+        Возвращает индексы вопросов, все варианты ответов которых входят в condition_answers.
+        """
+        condition_answers = set(condition_answers)
+        return [question_index for question_index, possible_answer in enumerate(self.schema.possible_answers_list)
+                if condition_answers.issuperset(possible_answer)]
+
+    def _find_required_cycles(self):
+        """
+        Находит группы вопросов, взаимно достижимых по required_graph (циклы обязательных условий).
+        """
+        reachable = []
+        for question_index in range(len(self.required_graph)):
+            visited = set()
+            worklist = list(self.required_graph[question_index])
+            while worklist:
+                required_question = worklist.pop()
+                if required_question not in visited:
+                    visited.add(required_question)
+                    worklist.extend(self.required_graph[required_question])
+            reachable.append(visited)
+        cycles = []
+        in_cycle = set()
+        for question_index, visited in enumerate(reachable):
+            if question_index in visited and question_index not in in_cycle:
+                cycle = sorted(other for other in visited if question_index in reachable[other])
+                in_cycle.update(cycle)
+                cycles.append(cycle)
+        return cycles
+
+    def row_mask(self, row):
+        """
+        Кодирует анкету битовой маской по первым трем символам ячеек; коды вне опросника и условий не учитываются.
+        """
+        mask = 0
+        for cell in row:
+            mask |= self.code_masks.get(cell[:3], 0)
+        return mask
+
+    def contains(self, row_mask, code):
+        """
+        Проверяет, есть ли код в анкете, закодированной маской row_mask.
+        """
+        return bool(row_mask & self.code_masks.get(code, 0))
+
+    def exception_hits(self, code, row_mask):
+        """
+        Возвращает исключенные кодом code коды, присутствующие в анкете (в порядке условия).
+        """
+        if not row_mask & self.exception_masks.get(code, 0):
+            return []
+        return [exception_answer for exception_answer in self.exception_answers[code]
+                if row_mask & self.code_masks[exception_answer]]
+
+    def exception_answers_count(self, code, row_mask):
+        """
+        Подсчитывает ответы анкеты на вопросы, целиком исключенные кодом code.
+
+        Возвращаемое значение:
+          Tuple[int, int]: Количество таких вопросов и количество ответов анкеты на них.
+        """
+        return (len(self.exception_questions.get(code, ())),
+                (row_mask & self.exception_questions_masks.get(code, 0)).bit_count())
+
+    def missing_required_questions(self, code, row_mask):
+        """
+        Возвращает вопросы, ответ на которые обязателен для кода code, но отсутствует в анкете.
+        """
+        return [question_index for question_index in self.required_questions.get(code, ())
+                if not row_mask & self.question_masks[question_index]]
+
+
+def compile_conditions(schema, question_exception_answers, question_required_answers):
+    """
+    Компилирует условия проверки из parse_conditions_data в битовые маски.
+
+    Параметры:
+      - schema (Questionnaire): Скомпилированная схема опросника.
+      - question_exception_answers (Dict[str, List[str]]): Исключающие условия (код ответа -> список исключенных кодов).
+      - question_required_answers (Dict[str, List[str]]): Обязательные условия (код ответа -> список требуемых кодов).
+
+    Возвращаемое значение:
+      ConditionRules: Скомпилированные условия.
+    """
+    return ConditionRules(schema, question_exception_answers, question_required_answers)
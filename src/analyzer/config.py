@@ -21,6 +21,31 @@ def load_config(config_path="src/config.json"):
       - answer_data_ext (list): Расширения файлов ответов (по умолчанию [".opr", ".txt"]).
       - conditions_ext (str): Расширение файлов условий (по умолчанию ".cnf").
       - may_repeat (bool): Разрешено ли повторение (по умолчанию False) [[3]][[10]].
+      - ingest_workers (int): Количество процессов для параллельного чтения файлов ответов (по умолчанию 1).
+      - use_cache (bool): Использовать ли бинарный кэш разобранных входных данных (по умолчанию True).
+      - validation_engine (str): Движок валидации анкет: "python" или "numpy" (по умолчанию "python").
+      - correction_mode (str): Режим исправления анкет: "global" или "local" (по умолчанию "global").
+      - correction_max_attempts (int): Максимальное количество попыток исправления одной анкеты в режиме "local"
+        и итераций исправления в режиме "global" (по умолчанию 10).
+      - correlation_engine (str): Способ расчета корреляций для сильных пар: "pandas" или "sparse" (по умолчанию "pandas").
+      - correlation_dtype (str): Тип вычислений корреляций при correlation_engine="sparse": "float64" или "float32" (по умолчанию "float64").
+      - rule_miner (str): Способ поиска ассоциативных правил: "fpgrowth" или "pairs" (по умолчанию "fpgrowth").
+      - max_rules (int): Максимальное количество ассоциативных правил на кластер, 0 — без ограничения (по умолчанию 0).
+      - rules_memory_budget_mb (float): Ограничение памяти на таблицу правил кластера в МБ, 0 — без ограничения (по умолчанию 0).
+      - generation_mode (str): Режим генерации анкет: "row" (по одной) или "batch" (пакетами) (по умолчанию "row").
+      - generation_batch_size (int): Количество анкет в одном пакете при generation_mode="batch" (по умолчанию 10000).
+      - generation_workers (int): Количество процессов для параллельной генерации кластеров (по умолчанию 1).
+      - constrained_generation (bool): Генерировать ли анкеты сразу корректными по условиям проверки,
+        проверяя после генерации только повторы (по умолчанию False).
+      - duplicate_filter (str): Фильтр повторяющихся анкет при генерации (при may_repeat=False): "set" (точное
+        множество отпечатков) или "bloom" (фильтр Блума) (по умолчанию "set"). При streaming_output=True
+        всегда используется "bloom".
+      - streaming_output (bool): Потоковый режим: сгенерированные анкеты проверяются пакетами и сразу дописываются
+        в файлы .opr, не накапливаясь в памяти; оценка качества не выполняется (по умолчанию False).
+        Память под анкеты зависит от streaming_batch_size, но фильтр Блума для поиска повторов остается
+        O(needed_answers_count): около 29 бит (~3.6 байта) на анкету при доле ложных срабатываний 1e-6,
+        выделяется сразу и не растет (например, ~360 МБ на 100 млн анкет).
+      - streaming_batch_size (int): Количество анкет, генерируемых за один проход в потоковом режиме (по умолчанию 100000).
 
     Исключения:
       - ValueError: Если файл JSON содержит ошибки форматирования.
@@ -30,7 +55,15 @@ def load_config(config_path="src/config.json"):
         default_config = {"ignored_codes": ["999"], "needed_answers_count": 600, "static_error": 0.005,
                           "strong_pairs_coefficient": 0.5, "data_dir": "data", "question_data_ext": ".anc",
                           "answer_data_ext": [".opr", ".txt"],
-                          "conditions_ext": ".cnf", "may_repeat": False}
+                          "conditions_ext": ".cnf", "may_repeat": False, "ingest_workers": 1,
+                          "use_cache": True, "validation_engine": "python",
+                          "correction_mode": "global", "correction_max_attempts": 10,
+                          "correlation_engine": "pandas", "correlation_dtype": "float64",
+                          "rule_miner": "fpgrowth", "max_rules": 0, "rules_memory_budget_mb": 0,
+                          "generation_mode": "row", "generation_batch_size": 10000,
+                          "generation_workers": 1, "constrained_generation": False,
+                          "duplicate_filter": "set", "streaming_output": False,
+                          "streaming_batch_size": 100000}
         with open(config_path, 'w', encoding='utf-8') as f:
             json.dump(default_config, f, indent=2)
         print(f"Создан файл конфигурации по умолчанию: {config_path}")
@@ -54,4 +87,21 @@ def load_config(config_path="src/config.json"):
     config["answer_data_ext"] = config.get("answer_data_ext", [".opr", ".txt"])
     config["conditions_ext"] = config.get("conditions_ext", ".cnf")
     config["may_repeat"] = config.get("may_repeat", False)
+    config["ingest_workers"] = int(config.get("ingest_workers", 1))
+    config["use_cache"] = config.get("use_cache", True)
+    config["validation_engine"] = config.get("validation_engine", "python")
+    config["correction_mode"] = config.get("correction_mode", "global")
+    config["correction_max_attempts"] = int(config.get("correction_max_attempts", 10))
+    config["correlation_engine"] = config.get("correlation_engine", "pandas")
+    config["correlation_dtype"] = config.get("correlation_dtype", "float64")
+    config["rule_miner"] = config.get("rule_miner", "fpgrowth")
+    config["max_rules"] = int(config.get("max_rules", 0))
+    config["rules_memory_budget_mb"] = float(config.get("rules_memory_budget_mb", 0))
+    config["generation_mode"] = config.get("generation_mode", "row")
+    config["generation_batch_size"] = int(config.get("generation_batch_size", 10000))
+    config["generation_workers"] = int(config.get("generation_workers", 1))
+    config["constrained_generation"] = config.get("constrained_generation", False)
+    config["duplicate_filter"] = config.get("duplicate_filter", "set")
+    config["streaming_output"] = config.get("streaming_output", False)
+    config["streaming_batch_size"] = int(config.get("streaming_batch_size", 100000))
     return config
@@ -1,13 +1,22 @@
 import glob
+import json
 import logging
 import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-import chardet
+from chardet.universaldetector import UniversalDetector
 
+from .answer_matrix import AnswerMatrix
 from .processor import log_with_print
 
 logger = logging.getLogger(__name__)
 
+ENCODING_SAMPLE_SIZE = 64 * 1024
+ENCODING_BLOCK_SIZE = 4 * 1024
+ENCODING_CACHE_PATH = "cache/encodings.json"
+
 
 def parse_question_data(data_dir, filename_question_extension):
     """
@@ -16,7 +25,7 @@ def parse_question_data(data_dir, filename_question_extension):
     Процесс включает:
       1. Проверку существования директории.
       2. Поиск файлов с заданным расширением и обработку случаев отсутствия или множественности файлов.
-      3. Определение кодировки файла с помощью chardet для корректного чтения.
+      3. Определение кодировки файла по начальному фрагменту (с кэшированием результата) для корректного чтения.
       4. Парсинг строк: выделение вопросов и их вариантов ответов, запись в словари.
 
     Параметры:
@@ -45,9 +54,8 @@ def parse_question_data(data_dir, filename_question_extension):
         log_with_print(
             f'Файлов с расширением "{filename_question_extension}" больше одного, будет выбран {questions_filename[0]}.')
     questions_filename = questions_filename[0]
-    with open(questions_filename, 'rb') as file:
-        enc = chardet.detect(file.read())
-    with open(questions_filename, 'r', encoding=enc['encoding'], errors='replace') as file:
+    encoding = detect_encoding(questions_filename)
+    with open(questions_filename, 'r', encoding=encoding, errors='replace') as file:
         lines = file.readlines()
     if not len(lines):
         raise TypeError(f"Файл с анкетой пуст.")
@@ -76,40 +84,264 @@ def parse_question_data(data_dir, filename_question_extension):
     return code_to_text, questions
 
 
-def parse_answer_data(data_dir, filename_answer_extension):
+def load_encoding_cache(cache_path=ENCODING_CACHE_PATH):
+    """
+    Загружает с диска кэш определенных ранее кодировок.
+
+    Параметры:
+      - cache_path (str): Путь к файлу кэша.
+
+    Возвращаемое значение:
+      - Dict[str, Dict]: Словарь "абсолютный путь к файлу -> {size, mtime, encoding}".
+        Если кэш отсутствует или поврежден, возвращается пустой словарь.
+    """
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_encoding_cache(cache, cache_path=ENCODING_CACHE_PATH):
+    """
+    Сохраняет кэш кодировок на диск, заменяя файл атомарно.
+
+    Каждый вызов пишет во временный файл с уникальным именем, поэтому одновременные запуски
+    не перезаписывают временные файлы друг друга.
+    """
+    cache_dir = os.path.dirname(cache_path) or "."
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(cache_path) + ".", suffix=".tmp", dir=cache_dir)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def detect_encodings(filenames):
+    """
+    Определяет кодировки нескольких файлов с общим кэшем, который сохраняется на диск один раз.
+
+    Параметры:
+      - filenames (List[str]): Пути к файлам.
+
+    Возвращаемое значение:
+      - List[str | None]: Кодировки файлов в том же порядке.
+    """
+    cache = load_encoding_cache()
+    loaded_cache = dict(cache)
+    encodings = [detect_encoding(filename, cache) for filename in filenames]
+    if cache != loaded_cache:
+        try:
+            save_encoding_cache(cache)
+        except OSError as e:
+            logger.info(f"Не удалось сохранить кэш кодировок: {e}")
+    return encodings
+
+
+def detect_encoding(filename, cache=None, sample_size=ENCODING_SAMPLE_SIZE):
+    """
+    Определяет кодировку файла по его начальному фрагменту с использованием кэша на диске.
+
+    Процесс включает:
+      1. Поиск файла в кэше по абсолютному пути; запись считается актуальной, если совпадают размер и время изменения.
+      2. Чтение файла блоками и передачу их в UniversalDetector до тех пор, пока детектор не будет уверен
+         в результате или не будет прочитано sample_size байт.
+      3. Сохранение результата в кэш: на диск — только если кэш не передан (иначе кэш сохраняет вызывающий код,
+         см. detect_encodings).
+
+    Параметры:
+      - filename (str): Путь к файлу.
+      - cache (Dict[str, Dict] | None): Загруженный кэш кодировок, дополняемый результатом. Если не передан,
+        кэш читается и сохраняется в ENCODING_CACHE_PATH внутри функции.
+      - sample_size (int): Максимальное число байт, передаваемых в детектор.
+
+    Возвращаемое значение:
+      - str | None: Название кодировки или None, если определить её не удалось.
+    """
+    own_cache = cache is None
+    if own_cache:
+        cache = load_encoding_cache()
+    key = os.path.abspath(filename)
+    stat = os.stat(filename)
+    entry = cache.get(key)
+    if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime_ns:
+        return entry.get("encoding")
+    detector = UniversalDetector()
+    read = 0
+    with open(filename, 'rb') as file:
+        while read < sample_size and not detector.done:
+            block = file.read(min(ENCODING_BLOCK_SIZE, sample_size - read))
+            if not block:
+                break
+            detector.feed(block)
+            read += len(block)
+    detector.close()
+    encoding = detector.result['encoding']
+    cache[key] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "encoding": encoding}
+    if own_cache:
+        try:
+            save_encoding_cache(cache)
+        except OSError as e:
+            logger.info(f"Не удалось сохранить кэш кодировок: {e}")
+    logger.info(f"Кодировка файла {filename}: {encoding} (прочитано {read} байт).")
+    return encoding
+
+
+def find_answer_files(data_dir, filename_answer_extension):
+    """
+    Возвращает список файлов ответов в порядке расширений и результатов glob.
+
+    Параметры:
+      - data_dir (str): Путь к директории с файлами ответов.
+      - filename_answer_extension (List[str]): Список расширений файлов ответов (например, [".opr", ".txt"]).
+
+    Возвращаемое значение:
+      - List[str]: Пути к файлам ответов.
+
+    Исключения:
+      - FileNotFoundError: Если директория отсутствует.
+    """
+    if not os.path.exists(data_dir):
+        raise FileNotFoundError(f"Папка '{data_dir}' не найдена")
+    filenames = []
+    for ext in filename_answer_extension:
+        filenames.extend(glob.glob(data_dir + "/*" + ext))
+    return filenames
+
+
+def iter_file_rows(filename, encoding):
+    """
+    Построчно читает один файл ответов, возвращая непустые строки, разбитые по запятым.
+    """
+    with open(filename, 'r', encoding=encoding, errors='replace') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield line.split(',')
+
+
+def read_answer_file(filename, encoding):
+    """
+    Читает файл ответов целиком и замеряет время чтения (см. parse_answer_data).
+
+    Возвращаемое значение:
+      Tuple[List[List[str]], float]: Анкеты файла и время чтения в секундах.
+    """
+    start = time.perf_counter()
+    rows = list(iter_file_rows(filename, encoding))
+    return rows, time.perf_counter() - start
+
+
+def iter_answer_rows(data_dir, filename_answer_extension):
+    """
+    Лениво читает файлы ответов из указанной директории, возвращая анкеты по одной.
+
+    Процесс включает:
+      1. Проверку существования директории.
+      2. Поиск файлов с заданными расширениями (в порядке расширений и результатов glob).
+      3. Определение кодировки каждого файла по начальному фрагменту (с кэшированием результата).
+      4. Построчное чтение файла без загрузки его в память целиком.
+
+    Логирование:
+      - Для каждого прочитанного файла записывается число анкет и время чтения (вместе с обработкой анкет
+        вызывающим кодом), а также общее время чтения.
+
+    Параметры:
+      - data_dir (str): Путь к директории с файлами ответов.
+      - filename_answer_extension (List[str]): Список расширений файлов ответов (например, [".opr", ".txt"]).
+
+    Возвращаемое значение:
+      - Iterator[List[str]]: Анкеты в виде списков строковых значений, разделенных запятыми.
+
+    Исключения:
+      - FileNotFoundError: Если директория отсутствует.
+    """
+    filenames = find_answer_files(data_dir, filename_answer_extension)
+    encodings = detect_encodings(filenames)
+    start = time.perf_counter()
+    for filename_answer, encoding in zip(filenames, encodings):
+        file_start = time.perf_counter()
+        rows_count = 0
+        for row in iter_file_rows(filename_answer, encoding):
+            rows_count += 1
+            yield row
+        logger.info(f"Файл {filename_answer}: {rows_count} анкет, {time.perf_counter() - file_start:.3f} с.")
+    logger.info(f"Последовательное чтение {len(filenames)} файлов: {time.perf_counter() - start:.3f} с.")
+
+
+def parse_answer_matrix(data_dir, filename_answer_extension, schema):
+    """
+    Читает файлы ответов сразу в AnswerMatrix, не накапливая анкеты в виде списков строк.
+
+    Анкеты кодируются по одной по мере построчного чтения (iter_answer_rows), поэтому кроме самой
+    компактной матрицы в памяти находится только текущая строка файла.
+
+    Параметры:
+      - data_dir (str): Путь к директории с файлами ответов.
+      - filename_answer_extension (List[str]): Список расширений файлов ответов (например, [".opr", ".txt"]).
+      - schema (Questionnaire): Скомпилированная схема опросника.
+
+    Возвращаемое значение:
+      - AnswerMatrix: Анкеты, закодированные по схеме опросника.
+
+    Исключения:
+      - FileNotFoundError: Если директория отсутствует или файлы с указанными расширениями не найдены/пусты.
+    """
+    answer_matrix = AnswerMatrix.from_rows(iter_answer_rows(data_dir, filename_answer_extension), schema)
+    if len(answer_matrix) == 0:
+        raise FileNotFoundError(f"Файлы с расширениями '{filename_answer_extension}' не найдены или пусты.")
+    log_with_print(f'Ответы загружены, всего ответов: {len(answer_matrix)}')
+    return answer_matrix
+
+
+def parse_answer_data(data_dir, filename_answer_extension, workers=1):
     """
     Парсит файлы ответов из указанной директории, объединяя данные из всех найденных файлов.
 
     Процесс включает:
       1. Проверку существования директории.
       2. Поиск файлов с заданными расширениями.
-      3. Автоматическое определение кодировки файла с помощью chardet для корректного чтения.
-      4. Чтение строк, их очистку и разбиение на части для формирования списка ответов.
+      3. Определение кодировки файла по начальному фрагменту (с кэшированием результата).
+      4. Построчное чтение, очистку строк и разбиение на части для формирования списка ответов.
+         При workers > 1 файлы читаются параллельно в пуле процессов, а результаты объединяются
+         в том же порядке, что и при последовательном чтении (порядок расширений и результатов glob).
 
     Параметры:
       - data_dir (str): Путь к директории с файлами ответов.
       - filename_answer_extension (List[str]): Список расширений файлов ответов (например, [".opr", ".txt"]).
+      - workers (int): Количество процессов для параллельного чтения файлов (1 — последовательное чтение).
 
     Возвращаемое значение:
       - List[List[str]]: Список ответов, где каждый элемент — список строковых значений, разделенных запятыми.
 
     Исключения:
       - FileNotFoundError: Если директория отсутствует или файлы с указанными расширениями не найдены/пусты [[6]].
+
+    Логирование:
+      - Для каждого файла записывается число анкет и время чтения, а также общее время чтения
+        (одинаково при последовательном и параллельном чтении).
     """
+    filenames = find_answer_files(data_dir, filename_answer_extension)
+    encodings = detect_encodings(filenames)
     answers = []
-    if not os.path.exists(data_dir):
-        raise FileNotFoundError(f"Папка '{data_dir}' не найдена")
-    for ext in filename_answer_extension:
-        for filename_answer in glob.glob(data_dir + "/*" + ext):
-            with open(filename_answer, 'rb') as f:
-                enc = chardet.detect(f.read())
-            with open(filename_answer, 'r', encoding=enc['encoding'], errors='replace') as file:
-                lines = file.readlines()
-            for line in lines:
-                line = line.strip()
-                if line:
-                    parts = line.split(',')
-                    answers.append(parts)
+    start = time.perf_counter()
+    if workers > 1 and len(filenames) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(read_answer_file, filenames, encodings))
+        mode = f"Параллельное чтение {len(filenames)} файлов ({workers} процессов)"
+    else:
+        results = map(read_answer_file, filenames, encodings)
+        mode = f"Последовательное чтение {len(filenames)} файлов"
+    for filename, (rows, elapsed) in zip(filenames, results):
+        logger.info(f"Файл {filename}: {len(rows)} анкет, {elapsed:.3f} с.")
+        answers.extend(rows)
+    logger.info(f"{mode}: {time.perf_counter() - start:.3f} с.")
     if len(answers) == 0:
         raise FileNotFoundError(f"Файлы с расширениями '{filename_answer_extension}' не найдены или пусты.")
     log_with_print(f'Ответы загружены, всего ответов: {len(answers)}')
@@ -122,7 +354,7 @@ def parse_conditions_data(data_dir, filename_conditions_extension, len_questions
 
     Процесс включает:
       1. Проверку существования директории и файла условий.
-      2. Автоматическое определение кодировки файла с помощью chardet.
+      2. Определение кодировки файла по начальному фрагменту (с кэшированием результата).
       3. Чтение и разбор файла, разделенного символом '#' на 4 части:
           - максимальное число ответов на вопросы
           - исключающие условия (коды ответов)
@@ -155,9 +387,8 @@ def parse_conditions_data(data_dir, filename_conditions_extension, len_questions
         log_with_print(
             f'Файлов с расширением "{filename_conditions_extension}" больше одного, будет выбран {conditions_filename[0]}.')
     conditions_filename = conditions_filename[0]
-    with open(conditions_filename, 'rb') as file:
-        enc = chardet.detect(file.read())
-    with open(conditions_filename, 'r', encoding=enc['encoding'], errors='replace') as file:
+    encoding = detect_encoding(conditions_filename)
+    with open(conditions_filename, 'r', encoding=encoding, errors='replace') as file:
         lines = file.readlines()
     if not len(lines):
         raise TypeError(f"Файл с условиями пуст.")
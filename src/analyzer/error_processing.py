@@ -1,35 +1,47 @@
 import logging
 
-from .processor import log_with_print
+from .processor import delete_rows, log_with_print
 
 logger = logging.getLogger(__name__)
-from .validator import correct_questionnaires, validate_questionnaires
+from .validator import correct_questionnaires, correct_questionnaires_locally, validate_questionnaires
 
 
-def error_processing(errors, answers, possible_answers_list, ignored_codes,
-                     question_max_answers, question_min_answers, question_exception_answers,
-                     question_required_answers, static_error, may_repeat):
+def error_processing(errors, answers, schema, ignored_codes,
+                     question_max_answers, question_min_answers, conditions, static_error, may_repeat,
+                     validation_engine="python", validator=None, correction_mode="global",
+                     correction_max_attempts=10, frequency_model=None):
     """
         Обрабатывает и исправляет ошибки в анкетах через итеративную валидацию и коррекцию данных.
 
         Процесс включает:
           1. Циклическую проверку ошибок в анкетах (errors).
           2. Логирование деталей ошибок для каждой строки с нарушениями.
-          3. Исправление ошибок через функцию correct_questionnaires.
+          3. Исправление ошибок через функцию correct_questionnaires (correction_mode="global") или
+             correct_questionnaires_locally (correction_mode="local").
           4. Повторную валидацию данных через validate_questionnaires.
           5. Завершение цикла при отсутствии ошибок.
 
         Параметры:
           - errors (List[Dict]): Список ошибок, где каждый элемент содержит индекс строки и список сообщений об ошибках .
           - answers (List[List[str]]): Список ответов респондентов для коррекции и валидации.
-          - possible_answers_list (List[str]): Список допустимых вариантов ответов.
+          - schema (Questionnaire): Скомпилированная схема опросника.
           - ignored_codes (List[str]): Коды, исключенные из анализа.
           - question_max_answers (List[int]): Максимальное количество ответов на каждый вопрос.
           - question_min_answers (List[int]): Минимальное количество ответов на каждый вопрос.
-          - question_exception_answers (Dict[str, List[str]]): Исключающие условия между кодами ответов.
-          - question_required_answers (Dict[str, List[str]]): Обязательные условия между кодами ответов.
+          - conditions (ConditionRules): Скомпилированные исключающие и обязательные условия.
           - static_error (float): Порог статической ошибки для валидации.
           - may_repeat (bool): Разрешено ли повторение ответов.
+          - validation_engine (str): Движок повторной валидации ("python" или "numpy"), см. validate_questionnaires.
+          - validator (IncrementalValidator | None): Инкрементальный валидатор. Если передан, повторная валидация
+            проверяет только анкеты после зафиксированного префикса, а по завершении все анкеты фиксируются.
+          - correction_mode (str): "global" — исправление всех анкет с ошибками и полная перепроверка на каждой итерации;
+            "local" — каждая анкета исправляется и перепроверяется отдельно до получения корректной анкеты,
+            глобально повторяется только поиск дубликатов.
+          - correction_max_attempts (int): Максимальное количество попыток исправления одной анкеты: в режиме "local" —
+            попыток для каждой анкеты, в режиме "global" — итераций исправления. Анкеты, не исправленные за это
+            число попыток, удаляются.
+          - frequency_model (FrequencyModel | None): Счетчики ответов по всем анкетам answers; обновляются
+            при исправлении и удалении анкет, чтобы частоты не пересчитывались заново на каждой итерации.
 
         Возвращаемое значение:
           List[List[str]]: Обновлённый список ответов после успешной валидации и коррекции ошибок.
@@ -40,19 +52,46 @@ def error_processing(errors, answers, possible_answers_list, ignored_codes,
         """
 
     if errors:
+        iterations = 0
         while errors:
+            iterations += 1
             for error in errors:
                 logger.info(f"Анкета {error['row_index'] + 1}:")
                 for msg in error['errors']:
                     logger.info(msg)
-            answers = correct_questionnaires(answers, possible_answers_list, ignored_codes,
-                                             question_max_answers, question_min_answers, question_exception_answers,
-                                             question_required_answers, errors, static_error)
-            errors = validate_questionnaires(answers, possible_answers_list, ignored_codes,
-                                             question_max_answers, question_min_answers, question_exception_answers,
-                                             question_required_answers, may_repeat)
+            if correction_mode == "local":
+                answers, attempts_count, not_converged = correct_questionnaires_locally(
+                    answers, schema, ignored_codes, question_max_answers, question_min_answers, conditions, errors,
+                    static_error, correction_max_attempts, frequency_model)
+                log_with_print(f"Итерация {iterations}: выполнено исправлений анкет: {attempts_count}, "
+                               f"удалено неисправленных анкет: {len(not_converged)}.")
+                if not_converged:
+                    logger.info(f"Не исправлены анкеты: {', '.join(str(row + 1) for row in not_converged)}.")
+            else:
+                answers = correct_questionnaires(answers, schema, ignored_codes,
+                                                 question_max_answers, question_min_answers, conditions, errors,
+                                                 static_error, frequency_model)
+            if validator is not None:
+                errors = validator.validate(answers)
+            else:
+                errors = validate_questionnaires(answers, schema, ignored_codes,
+                                                 question_max_answers, question_min_answers, conditions,
+                                                 may_repeat, validation_engine)
+            if errors and correction_mode != "local" and iterations >= correction_max_attempts:
+                # противоречащие друг другу условия могут не сходиться: оставшиеся анкеты с ошибками удаляются
+                not_converged = [error['row_index'] for error in errors]
+                if frequency_model is not None:
+                    frequency_model.remove_rows(answers[row] for row in not_converged)
+                delete_rows(answers, not_converged)
+                log_with_print(f"Итерация {iterations}: достигнуто ограничение в {correction_max_attempts} итераций, "
+                               f"удалено неисправленных анкет: {len(not_converged)}.")
+                logger.info(f"Не исправлены анкеты: {', '.join(str(row + 1) for row in not_converged)}.")
+                # анкеты удалены, а не прошли валидацию: сообщение об успешной валидации не выводится
+                break
         else:
-            log_with_print("Анкеты прошли валидацию.")
+            log_with_print(f"Анкеты прошли валидацию. Итераций исправления: {iterations}.")
     else:
         log_with_print("Анкеты прошли валидацию.")
+    if validator is not None:
+        validator.commit(answers)
     return answers
@@ -0,0 +1,130 @@
+import math
+
+import numpy as np
+
+from .processor import row_fingerprint
+
+BLOOM_ERROR_RATE = 1e-6
+
+
+class FingerprintSet:
+    """
+    Множество отпечатков анкет (row_fingerprint) для отбраковки повторяющихся анкет при генерации.
+
+    Вместе с отпечатком хранится номер анкеты, если он известен, поэтому множество заменяет словарь номеров
+    при поиске дубликатов в IncrementalValidator.
+
+    Атрибуты:
+      - fingerprints (Dict[bytes, int]): Отпечаток учтенной анкеты -> ее номер (-1, если номер неизвестен).
+    """
+
+    def __init__(self, rows=()):
+        self.fingerprints = {}
+        self.update(rows)
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self.fingerprints
+
+    def add(self, fingerprint, row_index=-1):
+        """
+        Добавляет отпечаток анкеты; номер сохраняется только для первой анкеты с этим отпечатком.
+        """
+        self.fingerprints.setdefault(fingerprint, row_index)
+
+    def row_index(self, fingerprint):
+        """
+        Возвращает номер учтенной анкеты с отпечатком fingerprint (-1, если номер неизвестен) или None.
+        """
+        return self.fingerprints.get(fingerprint)
+
+    def update(self, rows):
+        """
+        Добавляет отпечатки анкет rows (List[List[str]]).
+        """
+        for row in rows:
+            self.add(row_fingerprint(row))
+
+    def copy(self):
+        """
+        Возвращает независимую копию множества.
+        """
+        fingerprint_set = FingerprintSet()
+        fingerprint_set.fingerprints = dict(self.fingerprints)
+        return fingerprint_set
+
+
+class BloomFilter:
+    """
+    Фильтр Блума по отпечаткам анкет: то же, что FingerprintSet, но в фиксированном объеме памяти.
+
+    Размер битового массива и число хэш-функций рассчитываются по ожидаемому количеству анкет capacity
+    и доле ложных срабатываний error_rate. Позиции битов получаются двойным хэшированием двух половин
+    16-байтового отпечатка. Ложное срабатывание означает лишь то, что новая анкета будет сгенерирована заново.
+
+    Атрибуты:
+      - bits_count (int): Размер битового массива.
+      - hashes_count (int): Количество хэш-функций.
+      - bits (np.ndarray): Битовый массив (uint8).
+    """
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE, rows=()):
+        capacity = max(int(capacity), 1)
+        self.bits_count = max(int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)), 8)
+        self.hashes_count = max(int(round(self.bits_count / capacity * math.log(2))), 1)
+        self.bits = np.zeros((self.bits_count + 7) // 8, dtype=np.uint8)
+        self.update(rows)
+
+    def _positions(self, fingerprint):
+        first = int.from_bytes(fingerprint[:8], 'little')
+        second = int.from_bytes(fingerprint[8:16], 'little') | 1
+        return [(first + i * second) % self.bits_count for i in range(self.hashes_count)]
+
+    def __contains__(self, fingerprint):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(fingerprint))
+
+    def add(self, fingerprint, row_index=-1):
+        """
+        Добавляет отпечаток анкеты (номер анкеты row_index не хранится).
+        """
+        for position in self._positions(fingerprint):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def row_index(self, fingerprint):
+        """
+        Возвращает -1, если отпечаток, возможно, учтен (номер анкеты неизвестен), иначе None.
+        """
+        return -1 if fingerprint in self else None
+
+    def update(self, rows):
+        """
+        Добавляет отпечатки анкет rows (List[List[str]]).
+        """
+        for row in rows:
+            self.add(row_fingerprint(row))
+
+    def copy(self):
+        """
+        Возвращает независимую копию фильтра.
+        """
+        bloom_filter = BloomFilter.__new__(BloomFilter)
+        bloom_filter.bits_count = self.bits_count
+        bloom_filter.hashes_count = self.hashes_count
+        bloom_filter.bits = self.bits.copy()
+        return bloom_filter
+
+
+def compile_fingerprint_filter(rows, kind="set", capacity=0):
+    """
+    Строит фильтр отпечатков анкет для отбраковки повторов при генерации.
+
+    Параметры:
+      - rows (List[List[str]]): Уже имеющиеся анкеты.
+      - kind (str): "set" — точное множество отпечатков, "bloom" — фильтр Блума (меньше памяти на больших объемах).
+      - capacity (int): Ожидаемое общее количество анкет в фильтре (для "bloom").
+
+    Возвращаемое значение:
+      FingerprintSet | BloomFilter: Фильтр с отпечатками rows.
+    """
+    if kind == "bloom":
+        return BloomFilter(max(capacity, len(rows)), rows=rows)
+    return FingerprintSet(rows)
@@ -0,0 +1,82 @@
+import numpy as np
+
+
+class FrequencyModel:
+    """
+    Счетчики ответов по кодам опросника с расчетом частот в виде массивов.
+
+    Хранит количество вхождений каждого кода плоского пространства схемы (Questionnaire.codes)
+    и количество анкет. Анкеты можно добавлять и удалять по мере изменения набора данных,
+    не пересчитывая частоты по всем анкетам заново.
+
+    Атрибуты:
+      - schema (Questionnaire): Скомпилированная схема опросника.
+      - static_error (float): Порог статической ошибки для коррекции частот.
+      - counts (np.ndarray): Количество вхождений каждого кода (длина — число кодов схемы).
+      - rows_count (int): Количество учтенных анкет.
+    """
+
+    def __init__(self, schema, static_error):
+        self.schema = schema
+        self.static_error = static_error
+        self.counts = np.zeros(len(schema.codes), dtype=np.int64)
+        self.rows_count = 0
+
+    def _code_counts(self, rows):
+        code_ids = []
+        for row in rows:
+            for cell in row:
+                code_id = self.schema.code_to_index.get(cell[:3])
+                if code_id is not None:
+                    code_ids.append(code_id)
+        return np.bincount(np.asarray(code_ids, dtype=np.int64), minlength=len(self.counts))
+
+    def add_rows(self, rows):
+        """
+        Учитывает анкеты rows (List[List[str]]) в счетчиках.
+        """
+        rows = list(rows)
+        self.counts += self._code_counts(rows)
+        self.rows_count += len(rows)
+
+    def add_matrix(self, matrix):
+        """
+        Учитывает анкеты, закодированные в AnswerMatrix по схеме опросника, без преобразования в списки строк.
+        """
+        indices = np.asarray(matrix.indices)
+        known = indices[indices < matrix.known_count].astype(np.int64)
+        self.counts += np.bincount(known, minlength=len(self.counts))
+        self.rows_count += len(matrix)
+
+    def remove_rows(self, rows):
+        """
+        Исключает ранее учтенные анкеты rows (List[List[str]]) из счетчиков.
+        """
+        rows = list(rows)
+        self.counts -= self._code_counts(rows)
+        self.rows_count -= len(rows)
+
+    def replace_row(self, old_row, new_row):
+        """
+        Заменяет в счетчиках анкету old_row на исправленную анкету new_row.
+        """
+        self.remove_rows([old_row])
+        self.add_rows([new_row])
+
+    def frequencies(self):
+        """
+        Вычисляет нормализованные частоты ответов по текущим счетчикам.
+
+        Частота кода — count / rows_count, коррекция статической ошибкой — x' = x + (1 - x) * error,
+        затем частоты нормализуются так, чтобы их сумма по каждому вопросу была равна 1.
+
+        Возвращаемое значение:
+          List[List[float]]: Частоты ответов для каждого вопроса и варианта ответа (как в get_frequencies).
+        """
+        values = self.counts / self.rows_count if self.rows_count else np.zeros(len(self.counts))
+        if self.static_error:
+            values = values + (1 - values) * self.static_error
+        sums = np.bincount(self.schema.code_question, weights=values, minlength=self.schema.questions_count)
+        values = values / sums[self.schema.code_question]
+        offsets = self.schema.question_offsets.tolist()
+        return [values[offsets[i]:offsets[i + 1]].tolist() for i in range(self.schema.questions_count)]
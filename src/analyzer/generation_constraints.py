@@ -0,0 +1,100 @@
+import numpy as np
+
+
+class GenerationConstraints:
+    """
+    Условия проверки (.cnf) в виде матриц над плоским пространством кодов схемы для генерации корректных анкет.
+
+    Используются BatchGenerator: количество ответов выбирается в пределах [минимум, максимум] вопроса,
+    коды, исключенные уже выбранными ответами, не выбираются, обязательные вопросы заполняются,
+    а проверка valid_rows повторяет validate_row для сгенерированных анкет.
+
+    Атрибуты:
+      - max_answers (np.ndarray): Максимальное количество ответов на каждый вопрос.
+      - min_answers (np.ndarray): Минимальное количество ответов на каждый вопрос.
+      - conflicts (np.ndarray): Симметричная матрица несовместимых позиций кодов (float32, 1 — несовместимы):
+        код исключает другой код независимо от того, какой из них выбран первым.
+      - blocked_positions (np.ndarray): Позиции кодов, которые не могут быть выбраны: несовместимые с игнорируемыми
+        кодами (они есть в каждой анкете) или исключающие сами себя.
+      - question_matrix (np.ndarray): Позиция кода -> вопрос (float32, для подсчета ответов на вопросы).
+      - required_matrix (np.ndarray): Позиция кода -> вопросы, ответ на которые обязателен (float32).
+      - always_required (np.ndarray): Вопросы, обязательные для игнорируемых кодов.
+      - internal_conflicts (np.ndarray): Вопросы, коды которых исключают друг друга.
+    """
+
+    def __init__(self, schema, conditions, question_max_answers, question_min_answers, ignored_codes):
+        self.schema = schema
+        questions_count = schema.questions_count
+        self.max_answers = np.array(question_max_answers[:questions_count], dtype=np.int64)
+        self.min_answers = np.array(question_min_answers[:questions_count], dtype=np.int64)
+        code_positions = {}
+        for position, code in enumerate(schema.codes):
+            code_positions.setdefault(code, []).append(position)
+        self.conflicts = np.zeros((len(schema.codes), len(schema.codes)), dtype=np.float32)
+        self.blocked_positions = np.zeros(len(schema.codes), dtype=bool)
+        for code, exception_answers in conditions.exception_answers.items():
+            for exception_answer in exception_answers:
+                if code in ignored_codes:
+                    self.blocked_positions[code_positions.get(exception_answer, [])] = True
+                if exception_answer in ignored_codes:
+                    self.blocked_positions[code_positions.get(code, [])] = True
+                for position in code_positions.get(code, []):
+                    self.conflicts[position, code_positions.get(exception_answer, [])] = 1
+                    self.conflicts[code_positions.get(exception_answer, []), position] = 1
+        self.blocked_positions |= np.diagonal(self.conflicts) > 0
+        self.question_matrix = np.zeros((len(schema.codes), questions_count), dtype=np.float32)
+        self.question_matrix[np.arange(len(schema.codes)), schema.code_question] = 1
+        self.required_matrix = np.zeros((len(schema.codes), questions_count), dtype=np.float32)
+        for position, code in enumerate(schema.codes):
+            self.required_matrix[position, conditions.required_questions.get(code, [])] = 1
+        self.always_required = np.zeros(questions_count, dtype=bool)
+        for code in ignored_codes:
+            self.always_required[conditions.required_questions.get(code, [])] = True
+        offsets = schema.question_offsets.tolist()
+        self.internal_conflicts = np.array([self.conflicts[offsets[i]:offsets[i + 1], offsets[i]:offsets[i + 1]].any()
+                                            for i in range(questions_count)], dtype=bool)
+
+    def question_counts(self, selected):
+        """
+        Подсчитывает количество выбранных ответов на каждый вопрос (анкеты × вопросы).
+        """
+        return (selected.astype(np.float32) @ self.question_matrix).astype(np.int64)
+
+    def missing_required(self, selected, counts):
+        """
+        Возвращает обязательные для выбранных ответов вопросы без ответов (анкеты × вопросы).
+        """
+        required = ((selected.astype(np.float32) @ self.required_matrix) > 0) | self.always_required[None, :]
+        return required & (counts == 0)
+
+    def valid_rows(self, selected):
+        """
+        Проверяет сгенерированные анкеты на все условия validate_row (кроме повторов).
+
+        Возвращаемое значение:
+          np.ndarray: Булев массив корректных анкет.
+        """
+        counts = self.question_counts(selected)
+        selected_values = selected.astype(np.float32)
+        valid = ((counts <= self.max_answers) & (counts >= self.min_answers)).all(axis=1)
+        valid &= ~((selected_values @ self.conflicts) * selected_values > 0).any(axis=1)
+        valid &= ~(selected & self.blocked_positions).any(axis=1)
+        valid &= ~self.missing_required(selected, counts).any(axis=1)
+        return valid
+
+
+def compile_generation_constraints(schema, conditions, question_max_answers, question_min_answers, ignored_codes):
+    """
+    Компилирует условия проверки для генерации корректных анкет.
+
+    Параметры:
+      - schema (Questionnaire): Скомпилированная схема опросника.
+      - conditions (ConditionRules): Скомпилированные исключающие и обязательные условия.
+      - question_max_answers (List[int]): Максимальное количество ответов на каждый вопрос.
+      - question_min_answers (List[int]): Минимальное количество ответов на каждый вопрос.
+      - ignored_codes (List[str]): Коды, которые добавляются в каждую анкету.
+
+    Возвращаемое значение:
+      GenerationConstraints: Скомпилированные условия.
+    """
+    return GenerationConstraints(schema, conditions, question_max_answers, question_min_answers, ignored_codes)
@@ -0,0 +1,61 @@
+import pandas as pd
+
+from .processor import get_new_questionnaire_null
+from .sampling import AliasTable
+
+
+class GenerationIndex:
+    """
+    Поисковые структуры кластера для генерации анкет, строятся один раз по сильным парам и ассоциативным правилам.
+
+    Атрибуты:
+      - questionnaire_null (Dict[int, float]): Начальные вероятности выбора вопросов (см. get_new_questionnaire_null);
+        для каждой новой анкеты используется копия.
+      - adjacency (Dict[int, List[int]]): Вопрос -> сильно коррелирующие с ним вопросы в порядке strong_pairs_index.
+      - rule_answers (Dict[str, Dict[int, AliasTable]]): Предпосылка правила -> вопрос -> таблица выбора кодов
+        следствий этого вопроса (в порядке правил) с весами confidence, нормированными на сумму по вопросу.
+    """
+
+    def __init__(self, schema, strong_pairs_index, rules):
+        self.questionnaire_null = get_new_questionnaire_null(schema, strong_pairs_index)
+        self.adjacency = {}
+        for first_question, second_question in zip(strong_pairs_index["Вопрос 1"].tolist(),
+                                                   strong_pairs_index["Вопрос 2"].tolist()):
+            adjacent_questions = self.adjacency.setdefault(first_question, [])
+            if not pd.isna(second_question):
+                adjacent_questions.append(second_question)
+        grouped_rules = {}
+        for antecedent, consequent, confidence in zip(rules["antecedents"].tolist(), rules["consequents"].tolist(),
+                                                      rules["confidence"].tolist()):
+            question_index = schema.code_to_question.get(consequent)
+            if question_index is None:
+                continue
+            consequents, confidences = grouped_rules.setdefault(antecedent, {}).setdefault(question_index, ([], []))
+            consequents.append(consequent)
+            confidences.append(confidence)
+        self.rule_answers = {}
+        for antecedent, questions_rules in grouped_rules.items():
+            self.rule_answers[antecedent] = {
+                question_index: AliasTable(consequents, confidences)
+                for question_index, (consequents, confidences) in questions_rules.items()}
+
+    def new_questionnaire_null(self):
+        """
+        Возвращает копию начальных вероятностей выбора вопросов для новой анкеты.
+        """
+        return dict(self.questionnaire_null)
+
+
+def compile_generation_index(schema, strong_pairs_index, rules):
+    """
+    Строит поисковые структуры генерации для кластера.
+
+    Параметры:
+      - schema (Questionnaire): Скомпилированная схема опросника.
+      - strong_pairs_index (pd.DataFrame): Сильные пары вопросов (колонки "Вопрос 1", "Вопрос 2", "Корреляция").
+      - rules (pd.DataFrame): Ассоциативные правила (antecedents, consequents, confidence).
+
+    Возвращаемое значение:
+      GenerationIndex: Скомпилированные структуры.
+    """
+    return GenerationIndex(schema, strong_pairs_index, rules)
@@ -1,159 +1,243 @@
+import logging
+
 import numpy as np
 
-from .processor import get_frequencies, get_new_questionnaire_null
+from .batch_generator import BatchGenerator
+from .processor import row_fingerprint
+
+logger = logging.getLogger(__name__)
 
+GENERATION_BATCH_SIZE = 10000
+DUPLICATE_RETRIES = 100
 
-def get_new_answers(answers, possible_answers_list, static_error, strong_pairs_index, rules, new_answers_count,
-                    probabilities_per_questions, ignored_codes, question_required_answers):
+
+def get_new_answers(schema, sampling_tables, generation_index, new_answers_count, ignored_codes, conditions,
+                    rng=None, fingerprints=None):
     """
     Генерирует новые анкеты на основе статистических данных, сильных пар и ассоциативных правил.
 
+    Если передан фильтр fingerprints, анкета, совпадающая с уже имеющейся или сгенерированной в этом вызове,
+    сразу генерируется заново (не более DUPLICATE_RETRIES раз подряд). Фильтр только читается: отпечатки новых
+    анкет хранятся в локальном множестве, а в фильтр их добавляет валидатор при фиксации (IncrementalValidator.commit).
+
     Процесс включает:
       1. Циклическую генерацию новых анкет до достижения заданного количества (`new_answers_count`).
       2. Создание "нулевого" опросника с вероятностями выбора вопросов на основе корреляции вопросов.
-      3. Выбор вопросов и ответов на основе ассоциативных правил.
+      3. Выбор вопросов и ответов на основе ассоциативных правил и таблиц выбора кластера (sampling_tables).
       4. Добавление игнорируемых кодов и сортировку финального результата.
 
     Параметры:
-      - answers (List[List[str]]): Исходные ответы респондентов для анализа частот.
-      - possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
-      - static_error (float): Порог статической ошибки для коррекции частот.
-      - strong_pairs_index (pd.DataFrame): DataFrame с информацией о сильных корреляциях.
-      - rules (pd.DataFrame): Ассоциативные правила (antecedents -> consequents) с метриками confidence.
+      - schema (Questionnaire): Скомпилированная схема опросника.
+      - sampling_tables (SamplingTables): Таблицы выбора количества ответов и кодов кластера (см. compile_cluster_model).
+      - generation_index (GenerationIndex): Сильные пары и ассоциативные правила кластера (см. compile_generation_index).
       - new_answers_count (int): Количество новых анкет для генерации.
-      - probabilities_per_questions (Dict[int, Dict[int, float]]): Вероятности количества ответов на каждый вопрос.
       - ignored_codes (List[str]): Коды, которые добавляются в каждую новую анкету без изменений.
-      - question_required_answers (Dict[str, List[str]]): Обязательные условия (код ответа -> список требуемых кодов).
+      - conditions (ConditionRules): Скомпилированные исключающие и обязательные условия.
+      - rng (np.random.Generator | None): Генератор случайных чисел (по умолчанию глобальный np.random).
+      - fingerprints (FingerprintSet | BloomFilter | None): Отпечатки имеющихся анкет (см. compile_fingerprint_filter).
 
     Возвращаемое значение:
       List[List[str]]: Список новых анкет, где каждая анкета — список строковых кодов ответов с игнорируемыми кодами и сортировкой.
     """
-    frequencies = get_frequencies(answers, possible_answers_list, static_error)
+    if rng is None:
+        rng = np.random
     new_answers = []
+    new_fingerprints = set()
+    duplicates_count = 0
     while new_answers_count:
         new_answer = []
-        new_questionnaire_null = get_new_questionnaire_null(possible_answers_list, strong_pairs_index)
+        new_questionnaire_null = generation_index.new_questionnaire_null()
         while len(list(new_questionnaire_null.keys())):
             np_probe = np.array(list(new_questionnaire_null.values()), dtype=np.float64)
             np_probe /= np_probe.sum()
-            selected_question = np.random.choice(list(new_questionnaire_null.keys()),
-                                                 p=np_probe)
+            selected_question = rng.choice(list(new_questionnaire_null.keys()), p=np_probe)
             selected_question = selected_question.item()
-            selected_answers = generate_answer(selected_question, {}, possible_answers_list,
-                                               probabilities_per_questions, frequencies)
+            selected_answers = generate_answer(selected_question, None, sampling_tables, rng)
             for item in selected_answers:
                 new_answer.append(item.item())
             del new_questionnaire_null[selected_question]
-            if selected_question in strong_pairs_index['Вопрос 1'].unique():
-                filtered_rows = strong_pairs_index[strong_pairs_index['Вопрос 1'] == selected_question]
-                high_corr_questions = filtered_rows['Вопрос 2'].dropna().tolist()
+            if selected_question in generation_index.adjacency:
+                high_corr_questions = generation_index.adjacency[selected_question]
                 main_selected_answers = selected_answers
                 for selected_answer in main_selected_answers:
-                    pairs_from_rules = rules[rules['antecedents'] == selected_answer.item()]
-                    pairs_consequents = pairs_from_rules['consequents'].dropna().tolist()
-                    pairs_confidence = pairs_from_rules['confidence'].dropna().tolist()
-                    pairs_answers = zip(pairs_consequents, pairs_confidence)
+                    question_rules = generation_index.rule_answers.get(selected_answer.item(), {})
+                    rules_used = False
                     for question_index in high_corr_questions:
-                        if question_index in list(new_questionnaire_null.keys()):
-                            selected_answers = generate_answer(question_index, pairs_answers, possible_answers_list,
-                                                               probabilities_per_questions, frequencies)
+                        if question_index in new_questionnaire_null:
+                            # правила предпосылки используются только для первого подходящего вопроса,
+                            # остальные ответы выбираются по частотам
+                            rule_table = None if rules_used else question_rules.get(question_index)
+                            rules_used = True
+                            selected_answers = generate_answer(question_index, rule_table, sampling_tables, rng)
                             del new_questionnaire_null[question_index]
-                            new_answer_from_recursive, new_questionnaire_null = recursive_get_required_answers(
-                                selected_answers, question_required_answers, possible_answers_list,
-                                new_questionnaire_null, pairs_answers,
-                                probabilities_per_questions, frequencies, high_corr_questions)
-                            new_answer.extend(new_answer_from_recursive)
-        new_answers_count = new_answers_count - 1
+                            new_answer_from_required, new_questionnaire_null = get_required_answers(
+                                selected_answers, conditions, new_questionnaire_null, sampling_tables,
+                                high_corr_questions, rng)
+                            new_answer.extend(new_answer_from_required)
         new_answer.extend(ignored_codes)
-        new_answers.append(sorted(new_answer))
+        new_answer = sorted(new_answer)
+        if fingerprints is not None:
+            fingerprint = row_fingerprint(new_answer)
+            if fingerprint in new_fingerprints or fingerprint in fingerprints:
+                if duplicates_count < DUPLICATE_RETRIES:
+                    duplicates_count += 1
+                    continue
+                logger.warning(f"Не удалось сгенерировать неповторяющуюся анкету за {DUPLICATE_RETRIES} попыток, "
+                               "повтор будет обработан при проверке.")
+            duplicates_count = 0
+            new_fingerprints.add(fingerprint)
+        new_answers_count = new_answers_count - 1
+        new_answers.append(new_answer)
     return new_answers
 
 
-def generate_answer(question_index, pairs_answers, possible_answers_list, probabilities_per_questions, frequencies):
+def get_new_answers_batch(schema, sampling_tables, generation_index, new_answers_count, ignored_codes, conditions,
+                          batch_size=GENERATION_BATCH_SIZE, rng=None, constraints=None, fingerprints=None):
+    """
+    Генерирует новые анкеты пакетами с тем же распределением, что и get_new_answers.
+
+    Если переданы constraints, анкеты генерируются корректными по условиям проверки (см. BatchGenerator),
+    а анкеты, которые не удалось сделать корректными, заменяются новыми. Так же заменяются анкеты,
+    совпадающие с уже имеющимися по фильтру fingerprints или сгенерированными в этом вызове (фильтр только читается,
+    см. get_new_answers).
+
+    Процесс включает:
+      1. Построение таблиц генерации кластера (BatchGenerator).
+      2. Генерацию анкет пакетами по `batch_size`: порядок вопросов, количество ответов и сами ответы выбираются
+         сразу для всего пакета, анкеты с правилами и обязательными вопросами обрабатываются группами.
+      3. Добавление игнорируемых кодов и сортировку финального результата.
+
+    Параметры:
+      - schema (Questionnaire): Скомпилированная схема опросника.
+      - sampling_tables (SamplingTables): Таблицы выбора количества ответов и кодов кластера (см. compile_cluster_model).
+      - generation_index (GenerationIndex): Сильные пары и ассоциативные правила кластера (см. compile_generation_index).
+      - new_answers_count (int): Количество новых анкет для генерации.
+      - ignored_codes (List[str]): Коды, которые добавляются в каждую новую анкету без изменений.
+      - conditions (ConditionRules): Скомпилированные исключающие и обязательные условия.
+      - batch_size (int): Количество анкет, генерируемых за один проход.
+      - rng (np.random.Generator | None): Генератор случайных чисел (по умолчанию np.random.default_rng()).
+      - constraints (GenerationConstraints | None): Условия проверки для генерации корректных анкет.
+      - fingerprints (FingerprintSet | BloomFilter | None): Отпечатки имеющихся анкет (см. compile_fingerprint_filter).
+
+    Возвращаемое значение:
+      List[List[str]]: Список новых анкет в том же формате, что и у get_new_answers.
+
+    Исключения:
+      - ValueError: Если не удалось сгенерировать ни одной корректной неповторяющейся анкеты из batch_size анкет.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    generator = BatchGenerator(schema, sampling_tables, generation_index, conditions, constraints)
+    new_answers = []
+    new_fingerprints = set()
+    sampled_count = 0
+    while len(new_answers) < new_answers_count:
+        # с условиями часть анкет отбрасывается, поэтому размер пакета увеличивается на долю отброшенных
+        acceptance = len(new_answers) / sampled_count if sampled_count else 1.0
+        missing_count = new_answers_count - len(new_answers)
+        size = min(batch_size, int(np.ceil(missing_count / max(acceptance, 0.01))))
+        batch_answers = generator.to_answers(generator.sample(size, rng), ignored_codes)
+        if fingerprints is not None:
+            batch_answers = unique_answers(batch_answers, fingerprints, new_fingerprints, missing_count)
+        batch_answers = batch_answers[:missing_count]
+        sampled_count += size
+        if not new_answers and not batch_answers and sampled_count >= batch_size:
+            raise ValueError("Не удалось сгенерировать ни одной неповторяющейся анкеты, "
+                             "удовлетворяющей условиям проверки.")
+        new_answers.extend(batch_answers)
+    if sampled_count > new_answers_count:
+        logger.info(f"Сгенерировано анкет: {sampled_count}, из них отброшено не удовлетворяющих условиям проверки, "
+                    f"повторяющихся или лишних: {sampled_count - new_answers_count}.")
+    return new_answers
+
+
+def unique_answers(answers, fingerprints, new_fingerprints, limit):
+    """
+    Отбирает из answers не более limit анкет, отпечатков которых нет ни в фильтре fingerprints (только чтение),
+    ни в множестве new_fingerprints; отпечатки отобранных анкет добавляются в new_fingerprints.
+    """
+    selected_answers = []
+    for answer in answers:
+        if len(selected_answers) == limit:
+            break
+        fingerprint = row_fingerprint(answer)
+        if fingerprint not in new_fingerprints and fingerprint not in fingerprints:
+            new_fingerprints.add(fingerprint)
+            selected_answers.append(answer)
+    return selected_answers
+
+
+def generate_answer(question_index, rule_table, sampling_tables, rng=None):
     """
     Генерирует случайные ответы на вопрос на основе вероятностной модели и связей с другими вопросами.
 
     Процесс включает:
-      1. Поиск подходящих ответов из сильных пар (consequents), связанных с текущим вопросом.
-      2. Нормализацию уверенности (весов) найденных consequents для вероятностного выбора.
-      3. Определение количества ответов через случайный выбор с учетом вероятностей (probabilities_per_questions).
-      4. Выбор ответов из consequents или, при их отсутствии, из всех допустимых вариантов с учетом частот (frequencies).
+      1. Определение количества ответов по таблице выбора количества ответов вопроса.
+      2. Выбор ответов без возвращения из ответов-следствий правил (consequents) с нормированными confidence
+         или, при их отсутствии, из всех допустимых вариантов с учетом частот.
 
     Параметры:
-      - question_index (int): Индекс текущего вопроса в possible_answers_list.
-      - pairs_answers (List[Tuple[str, float]]): Список пар (ответ, уверенность), связанных с текущим вопросом.
-      - possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
-      - probabilities_per_questions (Dict[int, Dict[int, float]]): Вероятности количества ответов на каждый вопрос.
-      - frequencies (List[List[float]]): Двумерный список с нормализованными частотами ответов для выбора.
+      - question_index (int): Индекс текущего вопроса в схеме опросника.
+      - rule_table (AliasTable | None): Коды следствий правил для этого вопроса с нормированными confidence
+        (из GenerationIndex.rule_answers) или None, если правила не используются.
+      - sampling_tables (SamplingTables): Таблицы выбора количества ответов и кодов кластера.
+      - rng (np.random.Generator | None): Генератор случайных чисел (по умолчанию np.random).
 
     Возвращаемое значение:
       np.ndarray: Массив строковых кодов ответов, сгенерированных для указанного вопроса.
     """
-    consequents = []
-    confidences = []
-    for consequent, confidence in pairs_answers:
-        if consequent in possible_answers_list[question_index]:
-            consequents.append(consequent)
-            confidences.append(confidence)
-    if consequents and confidences:
-        confidences = list(map(lambda x: x / sum(confidences), confidences))
-        sel_count = list(probabilities_per_questions[question_index].keys())
-        sel_count_probability = list(probabilities_per_questions[question_index].values())
-        selected_answers_count = np.random.choice(sel_count, p=sel_count_probability)
-        if selected_answers_count > len(consequents):
-            selected_answers_count = len(consequents)
-        selected_answers = np.random.choice(consequents, size=selected_answers_count,
-                                            replace=False, p=confidences)
-    else:
-        sel_count = list(probabilities_per_questions[question_index].keys())
-        sel_count_probability = list(probabilities_per_questions[question_index].values())
-        selected_answers_count = np.random.choice(sel_count, p=sel_count_probability)
-        selected_answers = np.random.choice(possible_answers_list[question_index],
-                                            size=selected_answers_count, replace=False,
-                                            p=frequencies[question_index])
-    return selected_answers
+    selected_answers_count = sampling_tables.draw_count(question_index, rng)
+    if rule_table is not None:
+        return rule_table.sample(min(selected_answers_count, len(rule_table.values)), rng)
+    return sampling_tables.sample_codes(question_index, selected_answers_count, rng)
 
 
-def recursive_get_required_answers(selected_answers, question_required_answers, possible_answers_list,
-                                   new_questionnaire_null, pairs_answers, probabilities_per_questions,
-                                   frequencies, high_corr_questions):
+def get_required_answers(selected_answers, conditions, new_questionnaire_null, sampling_tables,
+                         high_corr_questions, rng=None):
     """
-    Рекурсивно добавляет обязательные ответы на основе вероятностной модели.
+    Добавляет обязательные ответы на основе вероятностной модели, обходя граф обязательных условий.
 
     Процесс включает:
       1. Итерацию по уже выбранным ответам (selected_answers).
-      2. Проверку наличия обязательных ответов для текущего ответа через `question_required_answers`.
-      3. Поиск допустимых вариантов ответов, соответствующих обязательным условиям.
-      4. Случайный выбор новых ответов с учетом вероятностей из `probabilities_per_questions` и `frequencies`.
-      5. Рекурсивное добавление новых обязательных ответов до полного выполнения всех условий.
+      2. Поиск вопросов, ответ на которые обязателен для текущего ответа (conditions.required_questions).
+      3. Случайный выбор новых ответов по таблицам выбора `sampling_tables`.
+      4. Обход обязательных условий новых ответов в глубину с явным стеком до полного выполнения всех условий.
+
+    Порядок ответов и выборов совпадает с рекурсивным обходом: ответы на обязательный вопрос обрабатываются
+    до перехода к следующему обязательному вопросу. Каждый вопрос удаляется из new_questionnaire_null
+    при выборе, поэтому обход конечен и при циклических условиях (они сообщаются при загрузке,
+    см. ConditionRules.required_cycles).
 
     Параметры:
       - selected_answers (List[str]): Список уже выбранных ответов, для которых проверяются обязательные условия.
-      - question_required_answers (Dict[str, List[str]]): Словарь обязательных условий (код ответа -> список требуемых кодов).
-      - possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
+      - conditions (ConditionRules): Скомпилированные исключающие и обязательные условия.
       - new_questionnaire_null (Dict[int, float]): Словарь с вероятностями выбора вопросов, обновляемый в процессе.
-      - pairs_answers (List[Tuple[int, int]]): Список пар ответов, связанных сильными взаимосвязями.
-      - probabilities_per_questions (Dict[int, Dict[int, float]]): Вероятности количества ответов на каждый вопрос.
-      - frequencies (List[List[float]]): Двумерный список с нормализованными частотами ответов для выбора.
+      - sampling_tables (SamplingTables): Таблицы выбора количества ответов и кодов кластера.
+      - high_corr_questions (List[int]): Вопросы, сильно связанные с текущим, — они не заполняются как обязательные.
+      - rng (np.random.Generator | None): Генератор случайных чисел (по умолчанию глобальный np.random).
 
     Возвращаемое значение:
       Tuple[List[str], Dict[int, float]]:
-        - new_answer: Список всех ответов, включая оригинальные и рекурсивно добавленные обязательные.
+        - new_answer: Список всех ответов, включая оригинальные и добавленные обязательные.
         - new_questionnaire_null: Обновлённый словарь вероятностей с исключёнными уже использованными индексами вопросов.
     """
     new_answer = []
-    for item in selected_answers:
-        new_answer.append(item.item())
-        if item in question_required_answers.keys():
-            questions_required = question_required_answers[item]
-            for i, possible_answer in enumerate(possible_answers_list):
-                if set(possible_answer).issubset(questions_required):
-                    if i in new_questionnaire_null.keys() and i not in high_corr_questions:
-                        selected_answers = generate_answer(i, pairs_answers, possible_answers_list,
-                                                           probabilities_per_questions, frequencies)
-                        del new_questionnaire_null[i]
-                        new_answer_from_recursive, new_questionnaire_null = recursive_get_required_answers(
-                            selected_answers, question_required_answers, possible_answers_list, new_questionnaire_null,
-                            pairs_answers, probabilities_per_questions, frequencies, high_corr_questions)
-                        new_answer.extend(new_answer_from_recursive)
+    # стек пар (ответы, обязательные вопросы последнего обработанного ответа)
+    worklist = [(iter(selected_answers), iter(()))]
+    while worklist:
+        answers, required_questions = worklist[-1]
+        question_index = next((i for i in required_questions
+                               if i in new_questionnaire_null and i not in high_corr_questions), None)
+        if question_index is not None:
+            required_answers = generate_answer(question_index, None, sampling_tables, rng)
+            del new_questionnaire_null[question_index]
+            worklist.append((iter(required_answers), iter(())))
+            continue
+        item = next(answers, None)
+        if item is None:
+            worklist.pop()
+            continue
+        item = item.item()
+        new_answer.append(item)
+        worklist[-1] = (answers, iter(conditions.required_questions.get(item, ())))
     return new_answer, new_questionnaire_null
@@ -1,22 +1,49 @@
+import argparse
+
+import numpy as np
 import pandas as pd
 from sdv.evaluation.single_table import evaluate_quality
 from sdv.metadata import Metadata
 
-from .analitics import k_mode_clusters, get_strong_pairs, get_rules
+from .analitics import k_mode_clusters
+from .answer_matrix import AnswerMatrix
+from .cache import input_files_key, load_survey_cache, save_survey_cache, survey_input_files
+from .cluster_generation import compile_cluster_models, compile_generation_pool, generate_clusters
+from .conditions import compile_conditions
+from .generation_constraints import compile_generation_constraints
 from .config import load_config
-from .data_parser import parse_question_data, parse_answer_data, parse_conditions_data, default_conditions
+from .data_parser import (parse_question_data, parse_answer_data, parse_answer_matrix, parse_conditions_data,
+                          default_conditions)
 from .error_processing import error_processing
-from .generator import get_new_answers
+from .fingerprints import compile_fingerprint_filter
+from .frequencies import FrequencyModel
 from .logger_config import setup_logging
-from .processor import parse_answers_to_questions, get_probabilities_per_questions, add_specify, join_if_list, \
-    log_with_print
-from .report import save_answers, save_df, save_answers_if_bad
-from .validator import validate_questionnaires
+from .processor import parse_answers_to_questions, add_specify, join_if_list, log_with_print
+from .report import AnswersWriter, save_answers, save_answers_if_bad
+from .schema import compile_questionnaire
+from .validator import validate_answer_matrix, validate_questionnaires, IncrementalValidator
 
 setup_logging()
 
 
-def main():
+def parse_arguments(argv=None):
+    """
+    Разбирает аргументы командной строки.
+
+    Аргументы:
+      - --seed (int): Начальное значение генератора случайных чисел для воспроизводимого запуска.
+      - --workers (int): Количество процессов для генерации кластеров (по умолчанию generation_workers из конфигурации).
+    """
+    parser = argparse.ArgumentParser(description="Генерация синтетических анкет.")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="начальное значение генератора случайных чисел (по умолчанию случайное)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="количество процессов для генерации кластеров")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
     try:
         config = load_config()
         log_with_print("Конфигурация загружена.")
@@ -26,90 +53,194 @@ def main():
     ignored_codes = config["ignored_codes"]
     needed_answers_count = config["needed_answers_count"]
     static_error = config["static_error"]
-    strong_pairs_coefficient = config["strong_pairs_coefficient"]
     data_dir = config["data_dir"]
     question_data_ext = config["question_data_ext"]
     answer_data_ext = config["answer_data_ext"]
     conditions_ext = config["conditions_ext"]
     may_repeat = config["may_repeat"]
-    try:
-        code_to_text, questions = parse_question_data(data_dir, question_data_ext)
-    except (FileNotFoundError, TypeError) as e:
-        log_with_print(f"Ошибка при чтении анкеты: {e}")
-        log_with_print("Выполнение программы остановлено.")
-        return 1
-
-    try:
-        question_max_answers, question_exception_answers, question_required_answers, question_min_answers = parse_conditions_data(
-            data_dir, conditions_ext, len(questions))
-    except TypeError as e:
-        log_with_print(f"Ошибка при чтении условий проверки: {e}")
-        choice = input("Хотите использовать стандартные условия проверки? (y/n): ").strip().lower()
-        if choice == 'y':
-            question_max_answers, question_exception_answers, question_required_answers, question_min_answers = default_conditions(
-                len(questions))
-            log_with_print("Используются стандартные условия проверки.")
-        else:
+    ingest_workers = config["ingest_workers"]
+    use_cache = config["use_cache"]
+    validation_engine = config["validation_engine"]
+    correction_mode = config["correction_mode"]
+    correction_max_attempts = config["correction_max_attempts"]
+    generation_workers = config["generation_workers"] if arguments.workers is None else arguments.workers
+    constrained_generation = config["constrained_generation"]
+    duplicate_filter = config["duplicate_filter"]
+    streaming_output = config["streaming_output"]
+    streaming_batch_size = config["streaming_batch_size"]
+    if streaming_output and duplicate_filter != "bloom":
+        # точное множество растет с каждой анкетой, в потоковом режиме нужен фильтр фиксированного размера
+        log_with_print(f'В потоковом режиме вместо duplicate_filter="{duplicate_filter}" используется "bloom".')
+        duplicate_filter = "bloom"
+    seed_sequence = np.random.SeedSequence(arguments.seed)
+    log_with_print(f"Начальное значение генератора случайных чисел: {seed_sequence.entropy}")
+    correction_seed, clustering_seed, clusters_seed = seed_sequence.spawn(3)
+    np.random.seed(correction_seed.generate_state(4))
+    cache_key = None
+    cached_survey = None
+    if use_cache:
+        try:
+            cache_key = input_files_key(
+                survey_input_files(data_dir, question_data_ext, answer_data_ext, conditions_ext))
+            cached_survey = load_survey_cache(cache_key)
+        except OSError as e:
+            log_with_print(f"Не удалось проверить кэш входных данных: {e}")
+    answer_matrix = None
+    conditions_from_file = True
+    if cached_survey is not None:
+        code_to_text, questions, conditions, answer_matrix = cached_survey
+        question_max_answers, question_exception_answers, question_required_answers, question_min_answers = conditions
+        log_with_print(f"Входные данные загружены из кэша, всего ответов: {len(answer_matrix)}")
+        schema = compile_questionnaire(questions)
+    else:
+        try:
+            code_to_text, questions = parse_question_data(data_dir, question_data_ext)
+        except (FileNotFoundError, TypeError) as e:
+            log_with_print(f"Ошибка при чтении анкеты: {e}")
             log_with_print("Выполнение программы остановлено.")
             return 1
 
-    answers = parse_answer_data(data_dir, answer_data_ext)
-    possible_answers_list = []
-    for possible_answers in questions.values():
-        possible_answers_list.append([possible_answer[0] for possible_answer in possible_answers])
-    errors = validate_questionnaires(answers, possible_answers_list, ignored_codes, question_max_answers,
-                                     question_min_answers, question_exception_answers, question_required_answers,
-                                     may_repeat)
-    answers = error_processing(errors, answers, possible_answers_list, ignored_codes,
-                               question_max_answers, question_min_answers, question_exception_answers,
-                               question_required_answers, static_error, may_repeat)
+        try:
+            question_max_answers, question_exception_answers, question_required_answers, question_min_answers = parse_conditions_data(
+                data_dir, conditions_ext, len(questions))
+        except TypeError as e:
+            log_with_print(f"Ошибка при чтении условий проверки: {e}")
+            choice = input("Хотите использовать стандартные условия проверки? (y/n): ").strip().lower()
+            if choice == 'y':
+                question_max_answers, question_exception_answers, question_required_answers, question_min_answers = default_conditions(
+                    len(questions))
+                log_with_print("Используются стандартные условия проверки.")
+                conditions_from_file = False
+            else:
+                log_with_print("Выполнение программы остановлено.")
+                return 1
+
+        schema = compile_questionnaire(questions)
+        if ingest_workers > 1:
+            answers = parse_answer_data(data_dir, answer_data_ext, ingest_workers)
+            answer_matrix = AnswerMatrix.from_rows(answers, schema) if cache_key and conditions_from_file else None
+        else:
+            # анкеты кодируются в матрицу по мере чтения файлов, без промежуточного списка строк
+            answer_matrix = parse_answer_matrix(data_dir, answer_data_ext, schema)
+    if cached_survey is None and cache_key and conditions_from_file:
+        save_survey_cache(cache_key, code_to_text, questions,
+                          (question_max_answers, question_exception_answers, question_required_answers,
+                           question_min_answers), answer_matrix)
+    conditions = compile_conditions(schema, question_exception_answers, question_required_answers)
+    for required_cycle in conditions.required_cycles:
+        log_with_print(f"Обязательные условия образуют цикл между вопросами: "
+                       f"{', '.join(str(question_index + 1) for question_index in required_cycle)}.")
+    frequency_model = FrequencyModel(schema, static_error)
+    if answer_matrix is not None:
+        # анкеты из кэша учитываются в частотах (и при engine="numpy" проверяются) по матрице,
+        # списки строк строятся один раз
+        frequency_model.add_matrix(answer_matrix)
+        answers = answer_matrix.to_answers()
+        if validation_engine == "numpy":
+            errors = validate_answer_matrix(answer_matrix, schema, ignored_codes, question_max_answers,
+                                            question_min_answers, conditions, may_repeat)
+        else:
+            errors = validate_questionnaires(answers, schema, ignored_codes, question_max_answers,
+                                             question_min_answers, conditions, may_repeat, validation_engine)
+        answer_matrix = None
+    else:
+        frequency_model.add_rows(answers)
+        errors = validate_questionnaires(answers, schema, ignored_codes, question_max_answers,
+                                         question_min_answers, conditions, may_repeat, validation_engine)
+    answers = error_processing(errors, answers, schema, ignored_codes,
+                               question_max_answers, question_min_answers, conditions, static_error, may_repeat,
+                               validation_engine, None, correction_mode, correction_max_attempts,
+                               frequency_model)
+    # фильтр отпечатков один на весь запуск: валидатор пополняет его при фиксации, генератор только читает
+    fingerprints = None
+    if not may_repeat:
+        fingerprints = compile_fingerprint_filter([], duplicate_filter, needed_answers_count)
+    validator = IncrementalValidator(schema, ignored_codes, question_max_answers, question_min_answers,
+                                     conditions, may_repeat, validation_engine, not constrained_generation,
+                                     fingerprints, not streaming_output)
+    validator.commit(answers)
     log_with_print(f'Анкет после валидации: {len(answers)}.')
     new_answers_afterall_count = needed_answers_count - len(answers)
     if new_answers_afterall_count < 0:
         new_answers_afterall_count = 0
     log_with_print(f'Необходимо сгенерировать: {new_answers_afterall_count} анкет.')
     if new_answers_afterall_count:
-        df_k_mode, clusters_count = k_mode_clusters(answers, len(questions.keys()))
+        df_k_mode, clusters_count = k_mode_clusters(answers, len(questions.keys()),
+                                                    int(clustering_seed.generate_state(1)[0]))
         existing_answers_len = len(answers)
-        parsed_codes_to_questions = parse_answers_to_questions(answers, possible_answers_list)
+        parsed_codes_to_questions = parse_answers_to_questions(answers, schema)
         df_code_questionnaires = pd.DataFrame(parsed_codes_to_questions, columns=questions.keys())
         df_code_questionnaires = df_code_questionnaires.applymap(join_if_list)
-        while len(answers) < needed_answers_count:
-            new_answers_count = needed_answers_count - len(answers)
-            for cluster_index in range(clusters_count):
-                df_k_mode_cluster = df_k_mode[df_k_mode["cluster"] == cluster_index].drop(columns=["cluster"])
-                cluster_answers = []
-                for _, row in df_k_mode_cluster.iterrows():
-                    cluster_answer = [val for val in row if val not in ignored_codes]
-                    cluster_answers.append(cluster_answer)
-                if cluster_index == clusters_count - 1:
-                    new_answers_count_by_cluster = needed_answers_count - len(answers)
-                else:
-                    new_answers_count_by_cluster = round(
-                        new_answers_count * (len(cluster_answers) / existing_answers_len))
-                parsed_cluster_codes = parse_answers_to_questions(cluster_answers, possible_answers_list)
-                df_code_cluster = pd.DataFrame(parsed_cluster_codes, columns=questions.keys())
-                df_code_cluster = df_code_cluster.applymap(join_if_list)
+        constraints = None
+        if constrained_generation:
+            constraints = compile_generation_constraints(schema, conditions, question_max_answers,
+                                                         question_min_answers, ignored_codes)
+        clusters_answers = []
+        df_code_clusters = []
+        for cluster_index in range(clusters_count):
+            df_k_mode_cluster = df_k_mode[df_k_mode["cluster"] == cluster_index].drop(columns=["cluster"])
+            cluster_answers = []
+            for row in df_k_mode_cluster.values.tolist():
+                cluster_answer = [val for val in row if val not in ignored_codes]
+                cluster_answers.append(cluster_answer)
+            parsed_cluster_codes = parse_answers_to_questions(cluster_answers, schema)
+            df_code_cluster = pd.DataFrame(parsed_cluster_codes, columns=questions.keys())
+            df_code_cluster = df_code_cluster.applymap(join_if_list)
+            clusters_answers.append(cluster_answers)
+            df_code_clusters.append(df_code_cluster)
+        # модели кластеров строятся один раз и используются на всех проходах генерации
+        cluster_models = compile_cluster_models(clusters_answers, df_code_clusters, schema, questions,
+                                                question_max_answers, config, generation_workers)
+        writer = None
+        if streaming_output:
+            # проверенные анкеты сразу дописываются в файлы и освобождаются, в памяти остается один пакет
+            writer = AnswersWriter()
+            writer.write_existing(add_specify(answers, code_to_text))
+            answers = validator.release(answers)
+        generation_pool = None
+        if generation_workers > 1 and clusters_count > 1:
+            # пул генерации создается один раз на запуск, между проходами в него рассылаются только новые отпечатки
+            generation_pool = compile_generation_pool(cluster_models, schema, conditions, config, generation_workers,
+                                                      constraints, fingerprints)
+            validator.take_committed_fingerprints()
+        while validator.released_count + len(answers) < needed_answers_count:
+            new_answers_count = needed_answers_count - validator.released_count - len(answers)
+            if streaming_output:
+                new_answers_count = min(new_answers_count, streaming_batch_size)
+            new_answers_counts = [round(new_answers_count * (len(cluster_answers) / existing_answers_len))
+                                  for cluster_answers in clusters_answers[:-1]]
+            new_answers_counts.append(max(0, new_answers_count - sum(new_answers_counts)))
+            if generation_pool is not None:
+                generation_pool.update(validator.take_committed_fingerprints())
+                clusters_new_answers = generation_pool.generate(new_answers_counts, clusters_seed.spawn(clusters_count))
+            else:
+                clusters_new_answers = generate_clusters(cluster_models, new_answers_counts, schema, conditions,
+                                                         config, clusters_seed.spawn(clusters_count), 1, constraints,
+                                                         fingerprints)
+            for cluster_index, new_answers in enumerate(clusters_new_answers):
+                answers_count = validator.released_count + len(answers)
                 log_with_print(
-                    f"Для кластера {cluster_index + 1} будут сгенерированы анкеты с {len(answers) + 1} по {len(answers) + new_answers_count_by_cluster}.")
-                strong_pairs_index = get_strong_pairs(cluster_answers, ignored_codes, possible_answers_list,
-                                                      questions, strong_pairs_coefficient)
-                rules = get_rules(cluster_answers)
-                save_df(cluster_index, strong_pairs_index, rules)
-                log_with_print(f"Сгенерированы отчеты для кластера {cluster_index + 1}.")
-                probabilities_per_questions = get_probabilities_per_questions(df_code_cluster, question_max_answers)
-                new_answers = get_new_answers(cluster_answers, possible_answers_list, static_error, strong_pairs_index,
-                                              rules, new_answers_count_by_cluster, probabilities_per_questions,
-                                              ignored_codes, question_required_answers)
+                    f"Для кластера {cluster_index + 1} сгенерированы анкеты с {answers_count + 1} по {answers_count + len(new_answers)}.")
                 answers.extend(new_answers)
-                log_with_print(f"Сгенерировано {len(new_answers)} анкет.")
-                errors = validate_questionnaires(answers, possible_answers_list, ignored_codes,
-                                                 question_max_answers,
-                                                 question_min_answers, question_exception_answers,
-                                                 question_required_answers, may_repeat)
-                answers = error_processing(errors, answers, possible_answers_list, ignored_codes,
-                                           question_max_answers, question_min_answers, question_exception_answers,
-                                           question_required_answers, static_error, may_repeat)
+                frequency_model.add_rows(new_answers)
+                errors = validator.validate(answers)
+                answers = error_processing(errors, answers, schema, ignored_codes,
+                                           question_max_answers, question_min_answers, conditions, static_error,
+                                           may_repeat, validation_engine, validator, correction_mode,
+                                           correction_max_attempts, frequency_model)
+                if writer is not None:
+                    writer.write_generated(add_specify(answers, code_to_text))
+                    answers = validator.release(answers)
+        if generation_pool is not None:
+            generation_pool.close()
+        if writer is not None:
+            writer.close()
+            if writer.plain_count:
+                log_with_print(f"Анкет, сохраненных без текстовых значений: {writer.plain_count}.")
+            log_with_print(f"Сгенерировано анкет: {writer.generated_count}. Отчетные данные сгенерированы "
+                           f"и находятся в папке /reports.")
+            log_with_print("В потоковом режиме оценка качества (evaluate_quality) не выполняется.")
+            return 0
         answers = add_specify(answers, code_to_text)
         try:
             save_answers(answers, new_answers_afterall_count)
@@ -118,7 +249,7 @@ def main():
             log_with_print(f"Не удалось сохранить отчетные данны .opr. {e}")
             log_with_print("Данные будут сохранены без текстовых значений")
             save_answers_if_bad(answers, new_answers_afterall_count)
-        parsed_synthetic = parse_answers_to_questions(answers, possible_answers_list)
+        parsed_synthetic = parse_answers_to_questions(answers, schema)
         df_synthetic = pd.DataFrame(parsed_synthetic, columns=questions.keys())
         df_synthetic = df_synthetic.applymap(join_if_list)
         metadata = Metadata.detect_from_dataframe(data=df_code_questionnaires)
@@ -1,22 +1,25 @@
+import hashlib
 import logging
 
 import numpy as np
 import pandas as pd
 
+from .frequencies import FrequencyModel
+from .sampling import AliasTable
 
-def get_frequencies(answers, possible_answers_list, static_error):
+
+def get_frequencies(answers, schema, static_error):
     """
     Вычисляет частоты ответов с возможностью коррекции статической ошибкой.
 
     Процесс включает:
-      1. Инициализацию двумерного списка для подсчёта частот ответов по каждому вопросу.
-      2. Итерацию по ответам респондентов и подсчёт встречаемости кодов ответов.
-      3. Коррекцию частот через статическую ошибку (если задана).
-      4. Нормализацию значений для получения вероятностей.
+      1. Подсчёт встречаемости кодов ответов через FrequencyModel (np.bincount по индексам кодов схемы).
+      2. Коррекцию частот через статическую ошибку (если задана).
+      3. Нормализацию значений для получения вероятностей.
 
     Параметры:
       - answers (List[List[str]]): Список ответов респондентов, где каждый элемент — список строковых кодов ответов.
-      - possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
+      - schema (Questionnaire): Скомпилированная схема опросника.
       - static_error (float): Порог статической ошибки для коррекции частот.
 
     Возвращаемое значение:
@@ -27,34 +30,23 @@ def get_frequencies(answers, possible_answers_list, static_error):
       - Коррекция статической ошибкой реализуется через формулу: x' = x + (1 - x) * error, где x — исходная частота.
       - Нормализация гарантирует, что сумма частот для каждого вопроса равна 1.
     """
-    frequencies_for_answers = [[0 for _ in range(len(possible_answer))] for possible_answer in possible_answers_list]
-    for row in answers:
-        for code in row:
-            for idx, possible_answer in enumerate(possible_answers_list):
-                if code[:3] in possible_answer:
-                    for i, ans in enumerate(possible_answer):
-                        if code[:3] == ans:
-                            frequencies_for_answers[idx][i] = frequencies_for_answers[idx][i] + 1 / len(answers)
-    for i in range(len(frequencies_for_answers)):
-        if static_error:
-            frequencies_for_answers[i] = list(map(lambda x: x + (1 - x) * static_error, frequencies_for_answers[i]))
-        frequencies_for_answers[i] = list(
-            map(lambda x: x / sum(frequencies_for_answers[i]), frequencies_for_answers[i]))
-    return frequencies_for_answers
-
-
-def parse_answers_to_questions(answers, possible_answers_list):
+    frequency_model = FrequencyModel(schema, static_error)
+    frequency_model.add_rows(answers)
+    return frequency_model.frequencies()
+
+
+def parse_answers_to_questions(answers, schema):
     """
     Преобразует список ответов в структурированный формат, группируя коды ответов по вопросам.
 
     Процесс включает:
       1. Итерацию по строкам ответов респондентов.
-      2. Сопоставление кодов ответов с заранее определёнными вариантами (possible_answers_list).
+      2. Сопоставление кодов ответов с вопросами по схеме опросника.
       3. Группировку ответов по вопросам с объединением нескольких ответов через запятую.
 
     Параметры:
       - answers (List[List[str]]): Список ответов респондентов, где каждый элемент — список строковых кодов ответов.
-      - possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
+      - schema (Questionnaire): Скомпилированная схема опросника.
 
     Возвращаемое значение:
       List[List[str]]: Двумерный список, где каждый элемент представляет строку ответов,
@@ -62,15 +54,14 @@ def parse_answers_to_questions(answers, possible_answers_list):
     """
     parsed_codes_to_questions = []
     for row in answers:
-        parsed_code_row = [[] for _ in range(len(possible_answers_list))]
+        parsed_code_row = [[] for _ in range(schema.questions_count)]
         for answer in row:
-            for i, possible_answer in enumerate(possible_answers_list):
-                if answer[:3] in possible_answer:
-                    if not parsed_code_row[i]:
-                        parsed_code_row[i] = answer
-                    else:
-                        parsed_code_row[i] = parsed_code_row[i] + "," + answer
-                    break
+            i = schema.code_to_question.get(answer[:3])
+            if i is not None:
+                if not parsed_code_row[i]:
+                    parsed_code_row[i] = answer
+                else:
+                    parsed_code_row[i] = parsed_code_row[i] + "," + answer
         parsed_codes_to_questions.append(parsed_code_row)
     return parsed_codes_to_questions
 
@@ -80,13 +71,14 @@ def corr_tfidf_to_questions(correlation_matrix, possible_answers_list, questions
         Преобразует корреляционную матрицу TF-IDF в матрицу корреляций между вопросами анкеты.
 
         Процесс включает:
-          1. Создание нулевой матрицы размером N×N, где N — количество вопросов.
-          2. Итерацию по парам вопросов (i, j) для вычисления корреляции между ними:
-              - Для каждой пары выбирается подматрица из исходной матрицы TF-IDF, соответствующая кодам ответов этих вопросов.
-              - Корреляция вычисляется как среднеквадратичное значение максимальных значений по строкам подматрицы.
+          1. Выбор для каждой пары вопросов (i, j) подматрицы исходной матрицы TF-IDF, соответствующей кодам ответов этих вопросов
+             (диапазон меток от первого до последнего кода вопроса).
+          2. Вычисление корреляции как среднеквадратичного значения максимальных значений по строкам подматрицы.
           3. Заполнение матрицы симметрично (corr[i,j] = corr[j,i]).
           4. Обнуление диагональных элементов (корреляция вопроса с самим собой не учитывается).
 
+        Вычисления выполняются над массивом NumPy через corr_tfidf_to_questions_array.
+
         Параметры:
           - correlation_matrix (pd.DataFrame): Корреляционная матрица TF-IDF, где индексы и столбцы — коды ответов.
           - possible_answers_list (List[List[str]]): Список допустимых кодов ответов для каждого вопроса.
@@ -98,20 +90,142 @@ def corr_tfidf_to_questions(correlation_matrix, possible_answers_list, questions
         Особенности:
           - Используется sqrt(mean(max(axis=1)^2)) для вычисления корреляции между вопросами, что учитывает доминирующие связи в подматрице.
         """
-    corr_matrix = pd.DataFrame(np.zeros((len(questions.keys()), len(questions.keys()))),
-                               index=questions.keys(), columns=questions.keys())
-    for i, possible_answer_i in enumerate(possible_answers_list):
-        for j, possible_answer_j in enumerate(possible_answers_list):
-            if i < j:
-                selected = correlation_matrix.loc[possible_answer_i[0]:possible_answer_i[-1],
-                           possible_answer_j[0]:possible_answer_j[-1]]
-                corr_matrix.iloc[i, j] = np.sqrt((selected.max(axis=1) ** 2).mean())
-                corr_matrix.iloc[j, i] = corr_matrix.iloc[i, j]
-            if i == j:
-                corr_matrix.iloc[i, i] = 0
+    corr_matrix = corr_tfidf_to_questions_array(correlation_matrix.to_numpy(dtype=np.float64),
+                                                correlation_matrix.columns.tolist(), possible_answers_list)
+    return pd.DataFrame(corr_matrix, index=questions.keys(), columns=questions.keys())
+
+
+def corr_tfidf_to_questions_array(correlation, feature_names, possible_answers_list):
+    """
+    Вычисляет матрицу корреляций между вопросами по корреляционной матрице кодов ответов без циклов по парам вопросов.
+
+    Процесс включает:
+      1. Поиск диапазона кодов каждого вопроса в отсортированных названиях признаков (np.searchsorted),
+         что совпадает с выборкой .loc[первый_код:последний_код].
+      2. Максимумы по строкам для всех блоков столбцов сразу (np.fmax.reduceat, NaN пропускаются как в pandas).
+      3. Среднеквадратичное значение максимумов по строкам блока каждого вопроса (np.add.reduceat).
+      4. Отражение верхнего треугольника на нижний и обнуление диагонали.
+
+    Параметры:
+      - correlation (np.ndarray): Корреляционная матрица кодов ответов (F × F).
+      - feature_names (List[str]): Коды ответов, соответствующие строкам и столбцам, в порядке возрастания.
+      - possible_answers_list (List[List[str]]): Список допустимых кодов ответов для каждого вопроса.
+
+    Возвращаемое значение:
+      np.ndarray: Матрица корреляций между вопросами (Q × Q); NaN, если для пары вопросов нет данных.
+    """
+    questions_count = len(possible_answers_list)
+    starts, ends, empty = question_code_ranges(feature_names, possible_answers_list)
+    block_max = row_block_max(correlation, starts, ends, empty)
+    squares = np.vstack([block_max ** 2, np.full((1, questions_count), np.nan)])
+    present = ~np.isnan(squares)
+    bounds = np.empty(2 * questions_count, dtype=np.int64)
+    bounds[0::2] = starts
+    bounds[1::2] = ends
+    sums = np.add.reduceat(np.where(present, squares, 0), bounds, axis=0)[0::2]
+    counts = np.add.reduceat(present.astype(np.int64), bounds, axis=0)[0::2]
+    sums[empty] = 0
+    counts[empty] = 0
+    values = np.sqrt(np.where(counts > 0, sums / np.maximum(counts, 1), np.nan))
+    return mirror_upper_triangle(values)
+
+
+def row_block_max(matrix, starts, ends, empty):
+    """
+    Вычисляет максимумы по строкам для блоков столбцов [starts[k], ends[k]) одним вызовом np.fmax.reduceat.
+
+    NaN пропускаются (как в DataFrame.max); для пустых блоков и строк без значений результат — NaN.
+
+    Возвращаемое значение:
+      np.ndarray: Массив размера (число строк × число блоков).
+    """
+    bounds = np.empty(2 * len(starts), dtype=np.int64)
+    bounds[0::2] = starts
+    bounds[1::2] = ends
+    padded = np.hstack([matrix, np.full((matrix.shape[0], 1), np.nan, dtype=matrix.dtype)])
+    with np.errstate(invalid='ignore'):
+        block_max = np.fmax.reduceat(padded, bounds, axis=1)[:, 0::2]
+    block_max[:, empty] = np.nan
+    return block_max
+
+
+def question_code_ranges(feature_names, possible_answers_list):
+    """
+    Находит для каждого вопроса диапазон [начало, конец) его кодов в отсортированных названиях признаков.
+
+    Диапазон совпадает с выборкой .loc[первый_код:последний_код] по отсортированному индексу.
+
+    Возвращаемое значение:
+      Tuple[np.ndarray, np.ndarray, np.ndarray]: Начала и концы диапазонов, признак пустого диапазона.
+    """
+    feature_names = np.asarray(feature_names, dtype=str)
+    first_codes = [possible_answer[0] if possible_answer else "" for possible_answer in possible_answers_list]
+    last_codes = [possible_answer[-1] if possible_answer else "" for possible_answer in possible_answers_list]
+    starts = np.searchsorted(feature_names, first_codes, side='left')
+    ends = np.maximum(np.searchsorted(feature_names, last_codes, side='right'), starts)
+    empty = np.array([not possible_answer for possible_answer in possible_answers_list], dtype=bool) | (starts == ends)
+    return starts, ends, empty
+
+
+def mirror_upper_triangle(values):
+    """
+    Отражает верхний треугольник матрицы вопросов на нижний и обнуляет диагональ.
+    """
+    upper = np.triu(np.ones(values.shape, dtype=bool), k=1)
+    corr_matrix = np.where(upper, values, values.T)
+    np.fill_diagonal(corr_matrix, 0)
     return corr_matrix
 
 
+def corr_sparse_to_questions_array(x, feature_names, possible_answers_list, dtype=np.float64):
+    """
+    Вычисляет матрицу корреляций между вопросами по разреженной матрице TF-IDF без построения плотной
+    корреляционной матрицы всех кодов.
+
+    Процесс включает:
+      1. Расчет средних и стандартных отклонений столбцов по разреженной матрице.
+      2. Для каждого вопроса i — корреляция Пирсона его кодов только с кодами вопросов j > i
+         через произведение Грама Xᵢᵀ·X (cov = XᵢᵀX − n·μᵢμᵀ); плотным становится только блок кодов вопроса i.
+      3. Максимумы по строкам для блоков вопросов j > i и их среднеквадратичное значение
+         (как в corr_tfidf_to_questions_array).
+
+    Параметры:
+      - x (scipy.sparse.spmatrix): Матрица TF-IDF (анкеты × коды ответов).
+      - feature_names (List[str]): Коды ответов, соответствующие столбцам x, в порядке возрастания.
+      - possible_answers_list (List[List[str]]): Список допустимых кодов ответов для каждого вопроса.
+      - dtype: Тип вычислений (np.float64 или np.float32 для экономии памяти).
+
+    Возвращаемое значение:
+      np.ndarray: Матрица корреляций между вопросами (Q × Q) того же вида, что и у corr_tfidf_to_questions_array.
+    """
+    questions_count = len(possible_answers_list)
+    rows_count = x.shape[0]
+    codes_by_rows = x.T.tocsr().astype(dtype)
+    means = np.asarray(codes_by_rows.sum(axis=1), dtype=dtype).ravel() / rows_count
+    squares = np.asarray(codes_by_rows.multiply(codes_by_rows).sum(axis=1), dtype=dtype).ravel()
+    stds = np.sqrt(np.maximum(squares - rows_count * means ** 2, 0))
+    stds[stds == 0] = np.nan
+    starts, ends, empty = question_code_ranges(feature_names, possible_answers_list)
+    values = np.full((questions_count, questions_count), np.nan)
+    for i in range(questions_count - 1):
+        targets = [j for j in range(i + 1, questions_count) if not empty[j]]
+        if empty[i] or not targets:
+            continue
+        low, high = int(starts[targets].min()), int(ends[targets].max())
+        gram = (codes_by_rows[low:high] @ codes_by_rows[starts[i]:ends[i]].toarray().T).T
+        covariance = gram - rows_count * np.outer(means[starts[i]:ends[i]], means[low:high])
+        with np.errstate(invalid='ignore'):
+            correlation = covariance / np.outer(stds[starts[i]:ends[i]], stds[low:high])
+        block_max = row_block_max(correlation, starts[targets] - low, ends[targets] - low,
+                                  np.zeros(len(targets), dtype=bool)).astype(np.float64)
+        present = ~np.isnan(block_max)
+        counts = present.sum(axis=0)
+        sums = np.where(present, block_max ** 2, 0).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values[i, targets] = np.sqrt(np.where(counts > 0, sums / np.maximum(counts, 1), np.nan))
+    return mirror_upper_triangle(values)
+
+
 def get_probabilities_per_questions(df, question_max_answers):
     """
     Вычисляет вероятности количества ответов на каждый вопрос на основе нормализованных частот.
@@ -182,99 +296,113 @@ def add_specify(answers, code_to_text):
     return answers
 
 
-def handle_exception_answer(error_row, question_exception_answers, possible_answers_list):
+def row_fingerprint(row):
+    """
+    Вычисляет отпечаток анкеты для поиска дубликатов (не зависит от порядка ответов).
+
+    Параметры:
+      - row (List[str]): Анкета — список строковых кодов ответов.
+
+    Возвращаемое значение:
+      bytes: 16-байтовый хэш blake2b отсортированных ответов анкеты.
+    """
+    return hashlib.blake2b('\x1f'.join(sorted(row)).encode('utf-8'), digest_size=16).digest()
+
+
+def delete_rows(answers, row_indices):
+    """
+    Удаляет анкеты с указанными индексами за один проход по списку.
+
+    Список изменяется на месте; в журнал записываются исходные номера удаленных анкет.
+
+    Параметры:
+      - answers (List[List[str]]): Список анкет.
+      - row_indices (Iterable[int]): Индексы удаляемых анкет (до удаления).
+
+    Возвращаемое значение:
+      List[List[str]]: Тот же список анкет без удаленных строк.
+    """
+    row_indices = set(row_indices)
+    if not row_indices:
+        return answers
+    answers[:] = [row for idx, row in enumerate(answers) if idx not in row_indices]
+    for row in sorted(row_indices):
+        logger.info(f"Анкета {row + 1} удалена.")
+    return answers
+
+
+def handle_exception_answer(error_row, conditions, schema):
     """
     Обрабатывает исключающие ответы на вопросы анкеты.
 
     Процесс включает:
-      1. Проверку каждого ответа в строке на соответствие ключам словаря `question_exception_answers`.
-      2. Подсчёт количества возможных исключающих ответов для текущего вопроса из `possible_answers_list`.
-      3. Определение, какие исключающие ответы присутствуют в текущей строке данных.
+      1. Проверку каждого ответа в строке на наличие исключающего условия.
+      2. Подсчёт вопросов, целиком исключаемых ответом, и ответов строки на них (по битовой маске строки).
       4. Формирование списка ответов, которые должны быть исключены:
           - Если вопросов, ответы на которые в списке исключенных, больше половины от возможного количество исключающихся вопросов, то удаляется исключающий ответ.
           - В противном случае удаляются конкретные исключающиеся ответы.
 
     Параметры:
       - error_row (List[str]): Строка ответов респондента, где каждый элемент — строковый код ответа.
-      - question_exception_answers (Dict[str, List[str]]): Словарь исключающих условий (код ответа -> список исключенных кодов).
-      - possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
+      - conditions (ConditionRules): Скомпилированные исключающие и обязательные условия.
+      - schema (Questionnaire): Скомпилированная схема опросника.
 
     Возвращаемое значение:
       List[str]: Список ответов, которые должны быть обработаны как исключения (исключены из строки).
     """
     handle_exception = []
+    row_mask = conditions.row_mask(error_row)
     for answer in error_row:
-        if answer[:3] in question_exception_answers.keys():
-            count_exception_answers_questions = 0
-            count_exception_answers_in_row = 0
-            exception_answers = []
-            for possible_answer in possible_answers_list:
-                if set(possible_answer).issubset(question_exception_answers[answer[:3]]):
-                    count_exception_answers_questions = count_exception_answers_questions + 1
-                    for exception_answer in possible_answer:
-                        if any(exception_answer in answer for answer in error_row):
-                            exception_answers.append(exception_answer)
-                            count_exception_answers_in_row = count_exception_answers_in_row + 1
+        if answer[:3] in conditions.exception_answers:
+            count_exception_answers_questions, count_exception_answers_in_row = \
+                conditions.exception_answers_count(answer[:3], row_mask)
             if count_exception_answers_in_row != 1 and count_exception_answers_in_row > round(
                     count_exception_answers_questions / 2):
                 handle_exception.append(answer)
             else:
-                for exception_answer in question_exception_answers[answer[:3]]:
+                for exception_answer in conditions.exception_answers[answer[:3]]:
                     if exception_answer in error_row:
                         handle_exception.append(exception_answer)
     return handle_exception
 
 
-def handle_required_answer(error_row, question_required_answers, possible_answers_list, frequencies):
+def handle_required_answer(error_row, conditions, sampling_tables):
     """
         Обрабатывает предполагающие ответы на основе частот встречаемости.
 
         Процесс включает:
-          1. Проверку каждого ответа в строке на соответствие ключам словаря `question_required_answers`.
-          2. Поиск обязательных ответов, связанных с текущим кодом, и проверку их наличия в строке.
-          3. Если обязательные ответы отсутствуют, выбирается один из возможных вариантов случайным образом с учетом вероятностей из `frequencies`.
+          1. Поиск вопросов, ответ на которые обязателен для ответов строки, но отсутствует (по битовой маске строки).
+          3. Если обязательные ответы отсутствуют, выбирается один из возможных вариантов случайным образом с учетом частот (по таблицам `sampling_tables`).
 
         Параметры:
           - error_row (List[str]): Строка ответов респондента, где каждый элемент — строковый код ответа.
-          - question_required_answers (Dict[str, List[str]]): Словарь обязательных условий (код ответа -> список требуемых кодов).
-          - possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
-          - frequencies (List[List[float]]): Двумерный список с нормализованными частотами ответов для каждого вопроса и варианта ответа.
+          - conditions (ConditionRules): Скомпилированные исключающие и обязательные условия.
+          - sampling_tables (SamplingTables): Таблицы выбора кодов ответов по частотам (см. compile_sampling_tables).
 
         Возвращаемое значение:
           List[str]: Список обязательных ответов, которые должны быть добавлены в строку для соблюдения условий.
     """
     handle_required = []
+    row_mask = conditions.row_mask(error_row)
     for answer in error_row:
-        if answer[:3] in question_required_answers.keys():
-            questions_required = question_required_answers[answer[:3]]
-            for i, possible_answer in enumerate(possible_answers_list):
-                if set(possible_answer).issubset(questions_required):
-                    count = 0
-                    for required_answer in possible_answer:
-                        if any(required_answer in cell[:3] for cell in error_row):
-                            count = 1
-                            break
-                    if not count:
-                        if set(possible_answer).issubset(question_required_answers[answer[:3]]):
-                            frequencies_for_required_answers = frequencies[i]
-                            selected_answer = np.random.choice(possible_answer,
-                                                               p=frequencies_for_required_answers)
-                            handle_required.append(selected_answer)
+        for i in conditions.missing_required_questions(answer[:3], row_mask):
+            selected_answer = sampling_tables.draw_code(i)
+            handle_required.append(selected_answer)
     return handle_required
 
 
-def handle_unnecessary_answer(error_row, possible_answers_list, ignored_codes):
+def handle_unnecessary_answer(error_row, schema, ignored_codes):
     """
     Удаляет коды ответов, которые не соответствуют допустимым вариантам и не находятся в списке игнорируемых.
 
     Процесс включает:
-      1. Проверку каждого кода в строке ответов на принадлежность к допустимым вариантам (possible_answers_list).
+      1. Проверку каждого кода в строке ответов на принадлежность к допустимым вариантам (по схеме опросника).
       2. Исключение кодов, присутствующих в списке игнорируемых (ignored_codes).
       3. Формирование списка кодов, которые не удовлетворяют ни одному из условий.
 
     Параметры:
       - error_row (List[str]): Строка ответов респондента, где каждый элемент — строковый код ответа.
-      - possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
+      - schema (Questionnaire): Скомпилированная схема опросника.
       - ignored_codes (List[str]): Коды, исключенные из анализа (например, резервные или служебные коды).
 
     Возвращаемое значение:
@@ -282,13 +410,12 @@ def handle_unnecessary_answer(error_row, possible_answers_list, ignored_codes):
     """
     handle_unnecessary = []
     for answer in error_row:
-        if (not any(answer[:3] in possible_answer for possible_answer in possible_answers_list)
-                and answer[:3] not in ignored_codes):
+        if answer[:3] not in schema.code_to_question and answer[:3] not in ignored_codes:
             handle_unnecessary.append(answer[:3])
     return handle_unnecessary
 
 
-def handle_limit_answer(error_row, error_row_index, possible_answers_list, question_max_answers, frequencies,
+def handle_limit_answer(error_row, error_row_index, schema, question_max_answers, sampling_tables,
                         question_min_answers):
     """
     Обрабатывает ограничения на количество ответов по вопросам (максимум/минимум) с вероятностным выбором.
@@ -304,9 +431,9 @@ def handle_limit_answer(error_row, error_row_index, possible_answers_list, quest
     Параметры:
       - error_row (List[str]): Строка ответов респондента, где каждый элемент — строковый код ответа.
       - error_row_index (int): Индекс строки в массиве ответов (для логирования).
-      - possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
+      - schema (Questionnaire): Скомпилированная схема опросника.
       - question_max_answers (List[int]): Максимальное количество ответов на каждый вопрос.
-      - frequencies (List[List[float]]): Двумерный список с нормализованными частотами ответов для выбора.
+      - sampling_tables (SamplingTables): Таблицы выбора кодов ответов по частотам (см. compile_sampling_tables).
       - question_min_answers (List[int]): Минимальное количество ответов на каждый вопрос.
 
     Возвращаемое значение:
@@ -315,28 +442,20 @@ def handle_limit_answer(error_row, error_row_index, possible_answers_list, quest
         - handeling_max_limit_append: Список кодов ответов, которые должны быть добавлены (случайный выбор).
         - handeling_min_limit_append: Список кодов ответов, которые должны быть добавлены (недостаток минимума).
     """
-    answers_count = [0 for _ in range(len(possible_answers_list))]
+    answers_count = schema.count_answers(error_row)
     handeling_max_limit_remove = []
     handeling_max_limit_append = []
     handeling_min_limit_append = []
-    for answer in error_row:
-        for i, possible_answer in enumerate(possible_answers_list):
-            if answer[:3] in possible_answer:
-                answers_count[i] = answers_count[i] + 1
-                break
     for i in range(len(question_max_answers)):
         if answers_count[i] > question_max_answers[i]:
-            frequencies_for_required_answers = frequencies[i]
+            frequencies_for_required_answers = sampling_tables.code_tables[i].weights
             answers_to_choice = []
             answers_frequencies = []
             for answer in error_row:
-                if answer[:3] in possible_answers_list[i]:
+                if schema.code_to_question.get(answer[:3]) == i:
                     answers_to_choice.append(answer)
-                    answers_frequencies.append(
-                        frequencies_for_required_answers[possible_answers_list[i].index(answer[:3])])
-            answers_frequencies = list(map(lambda x: x / sum(answers_frequencies), answers_frequencies))
-            selected_answers = np.random.choice(answers_to_choice, size=question_max_answers[i], replace=False,
-                                                p=answers_frequencies)
+                    answers_frequencies.append(frequencies_for_required_answers[schema.code_to_position[answer[:3]]])
+            selected_answers = AliasTable(answers_to_choice, answers_frequencies).sample(question_max_answers[i])
             for answer in answers_to_choice:
                 handeling_max_limit_remove.append(answer)
             for answer in selected_answers:
@@ -345,14 +464,13 @@ def handle_limit_answer(error_row, error_row_index, possible_answers_list, quest
             logger.info(
                 f'В анкете {error_row_index + 1} из ответов {answers_to_choice} были выбраны {selected_answers}')
         if answers_count[i] < question_min_answers[i]:
-            selected_answers = np.random.choice(possible_answers_list[i], size=question_min_answers[i],
-                                                replace=False, p=frequencies[i])
+            selected_answers = sampling_tables.sample_codes(i, question_min_answers[i])
             for answer in selected_answers:
                 handeling_min_limit_append.append(answer.item())
     return handeling_max_limit_remove, handeling_max_limit_append, handeling_min_limit_append
 
 
-def get_new_questionnaire_null(possible_answers_list, strong_pairs_index):
+def get_new_questionnaire_null(schema, strong_pairs_index):
     """
     Генерирует начальные вероятности выбора вопросов на основе корреляций сильных пар.
 
@@ -363,15 +481,15 @@ def get_new_questionnaire_null(possible_answers_list, strong_pairs_index):
       4. Формирование словаря соответствий "индекс вопроса -> вероятность".
 
     Параметры:
-      - possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
+      - schema (Questionnaire): Скомпилированная схема опросника.
       - strong_pairs_index (pd.DataFrame): DataFrame с информацией о парах вопросов с сильной корреляцией.
 
     Возвращаемое значение:
       Dict[int, float]: Словарь, где ключ — индекс вопроса, значение — нормализованная вероятность его выбора.
     """
-    new_questionnaire_null_questions = [i for i in range(len(possible_answers_list))]
+    new_questionnaire_null_questions = [i for i in range(schema.questions_count)]
     new_questionnaire_null_propabilities = [strong_pairs_index[strong_pairs_index["Вопрос 1"] == i].shape[0] + 1
-                                            for i in range(len(possible_answers_list))]
+                                            for i in range(schema.questions_count)]
     new_questionnaire_null_propabilities_np = np.array(list(new_questionnaire_null_propabilities), dtype=np.float64)
     new_questionnaire_null_propabilities_np /= new_questionnaire_null_propabilities_np.sum()
     new_questionnaire_null = dict(zip(new_questionnaire_null_questions, new_questionnaire_null_propabilities_np))
@@ -1,5 +1,7 @@
 import os
 
+OPR_BUFFER_SIZE = 1 << 20
+
 
 def save_answers(answers, new_answers_afterall):
     """
@@ -40,11 +42,78 @@ def save_answers_if_bad(answers, new_answers_afterall):
     return True
 
 
+class AnswersWriter:
+    """
+    Потоковая запись анкет в анкеты_готовые.opr и анкеты_сгенерированные.opr через буферизованные файлы.
+
+    Анкеты дописываются по мере проверки, поэтому в памяти не нужно хранить весь набор. Анкета,
+    текст которой не кодируется в кодировке файла, записывается без текстовых значений (как в save_answers_if_bad).
+
+    Атрибуты:
+      - ready_output: Файл анкеты_готовые.opr (исходные и сгенерированные анкеты).
+      - generated_output: Файл анкеты_сгенерированные.opr (только сгенерированные анкеты).
+      - generated_count (int): Количество записанных сгенерированных анкет.
+      - plain_count (int): Количество анкет, записанных без текстовых значений.
+    """
+
+    def __init__(self, buffer_size=OPR_BUFFER_SIZE):
+        os.makedirs("reports/opr", exist_ok=True)
+        self.ready_output = open("reports/opr/анкеты_готовые.opr", "w", buffering=buffer_size)
+        self.generated_output = open("reports/opr/анкеты_сгенерированные.opr", "w", buffering=buffer_size)
+        self.generated_count = 0
+        self.plain_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _lines(self, answers):
+        lines = []
+        for answer in answers:
+            line = ','.join(map(str, answer)) + '\n'
+            try:
+                line.encode(self.ready_output.encoding)
+            except UnicodeEncodeError:
+                line = ','.join(str(code)[:3] for code in answer) + '\n'
+                self.plain_count += 1
+            lines.append(line)
+        return lines
+
+    def write_existing(self, answers):
+        """
+        Дописывает исходные анкеты в анкеты_готовые.opr.
+        """
+        self.ready_output.writelines(self._lines(answers))
+
+    def write_generated(self, answers):
+        """
+        Дописывает сгенерированные анкеты в оба файла.
+        """
+        lines = self._lines(answers)
+        self.ready_output.writelines(lines)
+        self.generated_output.writelines(lines)
+        self.generated_count += len(lines)
+
+    def close(self):
+        """
+        Сбрасывает буферы и закрывает файлы.
+        """
+        self.ready_output.close()
+        self.generated_output.close()
+
+
 def save_df(cluster_index, strong_pairs, rules):
     """
-    Сохраняет вопросы с высокой корреляцией и ассоциативные правила для каждого кластера
+    Сохраняет вопросы с высокой корреляцией и ассоциативные правила для каждого кластера.
+    Строки упорядочиваются по паре вопросов и по паре предпосылка/следствие, чтобы отчеты запусков
+    с одинаковым --seed совпадали.
     """
     os.makedirs("reports/xlsx", exist_ok=True)
+    strong_pairs = strong_pairs.sort_values(["Вопрос 1", "Вопрос 2"], kind="stable")
+    rules = rules.sort_values(["antecedents", "consequents"], kind="stable")
     strong_pairs.to_excel(f"reports/xlsx/strong_pairs_cluster_{cluster_index + 1}.xlsx", index=False)
     rules.to_excel(f"reports/xlsx/fpgrowth_matrix_cluster_{cluster_index + 1}.xlsx", index=False)
     return True
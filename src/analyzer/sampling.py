@@ -0,0 +1,161 @@
+import numpy as np
+
+
+class AliasTable:
+    """
+    Таблица псевдонимов Уолкера для взвешенного выбора из фиксированного набора значений.
+
+    Таблица строится один раз за O(k); каждый выбор — одно равномерное случайное число и O(1) операций,
+    без нормализации вероятностей и их проверки, которые выполняет np.random.choice при каждом вызове.
+    Выбор нескольких значений без возвращения выполняется отбрасыванием уже выбранных значений, что дает
+    то же распределение, что и np.random.choice(..., replace=False, p=...).
+
+    Атрибуты:
+      - values (np.ndarray): Значения для выбора.
+      - weights (np.ndarray): Нормированные вероятности значений.
+      - probability (np.ndarray): Вероятность оставить выбранную ячейку таблицы.
+      - alias (np.ndarray): Индекс значения-псевдонима для каждой ячейки.
+      - nonzero_count (int): Количество значений с ненулевой вероятностью.
+    """
+
+    def __init__(self, values, weights):
+        self.values = np.asarray(values)
+        weights = np.asarray(weights, dtype=np.float64)
+        self.weights = weights / weights.sum()
+        self.nonzero_count = int(np.count_nonzero(self.weights))
+        size = len(self.weights)
+        scaled = (self.weights * size).tolist()
+        probability = [1.0] * size
+        alias = list(range(size))
+        small = [i for i, value in enumerate(scaled) if value < 1]
+        large = [i for i, value in enumerate(scaled) if value >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            probability[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+        self.probability = np.array(probability, dtype=np.float64)
+        self.alias = np.array(alias, dtype=np.int64)
+
+    def draw_indices(self, size, rng=None):
+        """
+        Выбирает size индексов значений с возвращением.
+
+        Целая часть u * k определяет ячейку таблицы, дробная — оставить ячейку или взять ее псевдоним.
+        """
+        if rng is None:
+            rng = np.random
+        scaled = rng.random(size) * len(self.probability)
+        cells = np.minimum(scaled.astype(np.int64), len(self.probability) - 1)
+        return np.where(scaled - cells < self.probability[cells], cells, self.alias[cells])
+
+    def draw(self, rng=None):
+        """
+        Выбирает одно значение.
+        """
+        return self.values[self.draw_indices(1, rng)[0]]
+
+    def sample_indices(self, size, rng=None):
+        """
+        Выбирает size различных индексов значений без возвращения в порядке выбора.
+
+        Повторно выбранные индексы отбрасываются. Когда выбранные значения покрывают больше половины
+        вероятности, оставшиеся индексы выбираются по накопленным вероятностям невыбранных значений,
+        чтобы число отброшенных выборов оставалось ограниченным.
+
+        Исключения:
+          - ValueError: Если ненулевых вероятностей меньше, чем size (как в np.random.choice).
+        """
+        if size > self.nonzero_count:
+            raise ValueError("Fewer non-zero entries in p than size")
+        if rng is None:
+            rng = np.random
+        selected = []
+        chosen = set()
+        chosen_weight = 0.0
+        while len(selected) < size and chosen_weight <= 0.5:
+            for index in self.draw_indices(size - len(selected), rng).tolist():
+                if index in chosen:
+                    continue
+                selected.append(index)
+                chosen.add(index)
+                chosen_weight += self.weights[index]
+                if len(selected) == size or chosen_weight > 0.5:
+                    break
+        if len(selected) < size:
+            remaining = self.weights.copy()
+            remaining[selected] = 0
+            for _ in range(size - len(selected)):
+                cumulative = np.cumsum(remaining)
+                index = int(np.searchsorted(cumulative, rng.random() * cumulative[-1], side='right'))
+                index = min(index, len(cumulative) - 1)
+                selected.append(index)
+                remaining[index] = 0
+        return np.array(selected, dtype=np.int64)
+
+    def sample(self, size, rng=None):
+        """
+        Выбирает size различных значений без возвращения в порядке выбора.
+        """
+        return self.values[self.sample_indices(size, rng)]
+
+
+class SamplingTables:
+    """
+    Таблицы псевдонимов кластера для выбора количества ответов на вопрос и кодов ответов.
+
+    Строятся один раз по get_probabilities_per_questions и get_frequencies и используются для всех выборов
+    при генерации и исправлении анкет.
+
+    Атрибуты:
+      - code_tables (List[AliasTable]): Коды ответов каждого вопроса с частотами frequencies.
+      - count_tables (List[AliasTable] | None): Количество ответов на каждый вопрос с вероятностями
+        probabilities_per_questions (None, если вероятности не переданы).
+    """
+
+    def __init__(self, schema, frequencies, probabilities_per_questions=None):
+        self.code_tables = [AliasTable(schema.possible_answers_list[i], frequencies[i])
+                            for i in range(schema.questions_count)]
+        self.count_tables = None
+        if probabilities_per_questions is not None:
+            self.count_tables = [AliasTable(list(probabilities_per_questions[i].keys()),
+                                            list(probabilities_per_questions[i].values()))
+                                 for i in range(schema.questions_count)]
+
+    def draw_count(self, question_index, rng=None):
+        """
+        Выбирает количество ответов на вопрос.
+        """
+        return int(self.count_tables[question_index].draw(rng))
+
+    def draw_code(self, question_index, rng=None):
+        """
+        Выбирает один код ответа на вопрос по частотам.
+        """
+        return self.code_tables[question_index].draw(rng)
+
+    def sample_codes(self, question_index, size, rng=None):
+        """
+        Выбирает size различных кодов ответов на вопрос по частотам без возвращения.
+        """
+        return self.code_tables[question_index].sample(size, rng)
+
+
+def compile_sampling_tables(schema, frequencies, probabilities_per_questions=None):
+    """
+    Строит таблицы выбора кластера.
+
+    Параметры:
+      - schema (Questionnaire): Скомпилированная схема опросника.
+      - frequencies (List[List[float]]): Нормализованные частоты ответов (см. get_frequencies).
+      - probabilities_per_questions (Dict[int, Dict[int, float]] | None): Вероятности количества ответов
+        на каждый вопрос (см. get_probabilities_per_questions).
+
+    Возвращаемое значение:
+      SamplingTables: Скомпилированные таблицы.
+    """
+    return SamplingTables(schema, frequencies, probabilities_per_questions)
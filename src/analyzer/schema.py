@@ -0,0 +1,92 @@
+import numpy as np
+
+
+class Questionnaire:
+    """
+    Скомпилированная схема опросника для поиска вопроса по коду ответа за O(1).
+
+    Строится один раз по списку допустимых вариантов ответов и используется валидатором,
+    обработчиком ошибок и генератором вместо линейного перебора possible_answers_list.
+
+    Атрибуты:
+      - possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
+      - questions_count (int): Количество вопросов.
+      - codes (List[str]): Все коды ответов подряд в порядке вопросов (плоское пространство кодов).
+      - code_to_question (Dict[str, int]): Код ответа -> индекс вопроса.
+      - code_to_position (Dict[str, int]): Код ответа -> позиция кода внутри вопроса.
+      - code_to_index (Dict[str, int]): Код ответа -> индекс в плоском пространстве кодов.
+      - question_offsets (np.ndarray): Границы вопросов в плоском пространстве кодов (длина questions_count + 1);
+        коды вопроса i занимают диапазон [question_offsets[i], question_offsets[i + 1]).
+      - code_question (np.ndarray): Индекс вопроса для каждого кода плоского пространства.
+      - code_position (np.ndarray): Позиция внутри вопроса для каждого кода плоского пространства.
+
+    Если код встречается в нескольких вопросах, словари указывают на первое вхождение,
+    как и при линейном поиске с break.
+    """
+
+    def __init__(self, possible_answers_list):
+        self.possible_answers_list = possible_answers_list
+        self.questions_count = len(possible_answers_list)
+        self.codes = []
+        self.code_to_question = {}
+        self.code_to_position = {}
+        self.code_to_index = {}
+        offsets = [0]
+        code_question = []
+        code_position = []
+        for question_index, possible_answer in enumerate(possible_answers_list):
+            for position, code in enumerate(possible_answer):
+                if code not in self.code_to_question:
+                    self.code_to_question[code] = question_index
+                    self.code_to_position[code] = position
+                    self.code_to_index[code] = len(self.codes)
+                self.codes.append(code)
+                code_question.append(question_index)
+                code_position.append(position)
+            offsets.append(len(self.codes))
+        self.question_offsets = np.array(offsets, dtype=np.int64)
+        self.code_question = np.array(code_question, dtype=np.int64)
+        self.code_position = np.array(code_position, dtype=np.int64)
+
+    def question_of(self, answer):
+        """
+        Возвращает индекс вопроса для ячейки анкеты (по первым трем символам) или None, если кода нет в опроснике.
+        """
+        return self.code_to_question.get(answer[:3])
+
+    def question_range(self, question_index):
+        """
+        Возвращает диапазон (начало, конец) кодов вопроса в плоском пространстве кодов.
+        """
+        return int(self.question_offsets[question_index]), int(self.question_offsets[question_index + 1])
+
+    def count_answers(self, row):
+        """
+        Подсчитывает количество ответов анкеты по каждому вопросу.
+
+        Параметры:
+          - row (List[str]): Анкета — список строковых кодов ответов.
+
+        Возвращаемое значение:
+          List[int]: Количество ответов на каждый вопрос; коды, отсутствующие в опроснике, не учитываются.
+        """
+        answers_count = [0] * self.questions_count
+        for answer in row:
+            question_index = self.code_to_question.get(answer[:3])
+            if question_index is not None:
+                answers_count[question_index] += 1
+        return answers_count
+
+
+def compile_questionnaire(questions):
+    """
+    Строит схему опросника по результату parse_question_data.
+
+    Параметры:
+      - questions (Dict[str, List[Tuple[str, str]]]): Словарь вопросов, где значение — список кортежей (код, текст варианта ответа).
+
+    Возвращаемое значение:
+      Questionnaire: Скомпилированная схема опросника.
+    """
+    return Questionnaire([[possible_answer[0] for possible_answer in possible_answers]
+                          for possible_answers in questions.values()])
@@ -1,13 +1,21 @@
 import logging
 
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .answer_matrix import AnswerMatrix
+from .fingerprints import BloomFilter
 from .processor import get_frequencies, handle_exception_answer, handle_required_answer, handle_unnecessary_answer, \
-    handle_limit_answer
+    handle_limit_answer, row_fingerprint, delete_rows
+from .sampling import compile_sampling_tables
 
 logger = logging.getLogger(__name__)
 
+VALIDATION_CHUNK_SIZE = 100000
+
 
-def validate_questionnaires(answers, possible_answers_list, ignored_codes, question_max_answers,
-                            question_min_answers, question_exception_answers, question_required_answers, may_repeat):
+def validate_questionnaires(answers, schema, ignored_codes, question_max_answers,
+                            question_min_answers, conditions, may_repeat, engine="python"):
     """
     Проверяет анкеты на соответствие заданным условиям (мин/макс ответы, исключения, обязательные ответы, дубликаты).
 
@@ -20,28 +28,29 @@ def validate_questionnaires(answers, possible_answers_list, ignored_codes, quest
 
     Параметры:
       - answers (List[List[str]]): Список анкет, где каждая анкета — список строковых кодов ответов.
-      - possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
+      - schema (Questionnaire): Скомпилированная схема опросника.
       - ignored_codes (List[str]): Коды, исключенные из анализа (например, резервные или служебные коды).
       - question_max_answers (List[int]): Максимальное количество ответов на каждый вопрос.
       - question_min_answers (List[int]): Минимальное количество ответов на каждый вопрос.
-      - question_exception_answers (Dict[str, List[str]]): Исключающие условия (код ответа -> список исключенных кодов).
-      - question_required_answers (Dict[str, List[str]]): Обязующие условия (код ответа -> список требуемых кодов).
+      - conditions (ConditionRules): Скомпилированные исключающие и обязательные условия (см. compile_conditions).
       - may_repeat (bool): Разрешено ли повторение одинаковых анкет.
+      - engine (str): "python" — построчная проверка, "numpy" — векторная проверка через validate_answer_matrix.
 
     Возвращаемое значение:
       List[Dict]: Список ошибок в формате {"row_index": индекс строки с ошибками, "errors": [сообщения], "error_code": [коды_ошибок]}.
       Возвращает 0, если ошибок нет.
     """
+    if engine == "numpy":
+        return validate_answer_matrix(AnswerMatrix.from_rows(answers, schema), schema, ignored_codes,
+                                      question_max_answers, question_min_answers, conditions, may_repeat)
     validation_errors = []
-    answers_count = []
     seen_rows = {}
     for idx, row in enumerate(answers):
         row_errors = []
         errors_code = []
-        answers_count.append([0 for _ in range(len(possible_answers_list))])
         breaked = False
-        key = tuple(sorted(row))
         if not may_repeat:
+            key = row_fingerprint(row)
             if key in seen_rows:
                 prev_idx = seen_rows[key]
                 row_errors.append(f"Анкета {idx + 1} совпадает с анкетой {prev_idx + 1}")
@@ -50,49 +59,329 @@ def validate_questionnaires(answers, possible_answers_list, ignored_codes, quest
             else:
                 seen_rows[key] = idx
         if not breaked:
-            for answer in row:
-                if answer[:3] in question_exception_answers.keys():
-                    for exception_answer in question_exception_answers[answer[:3]]:
-                        if any(exception_answer in cell[:3] for cell in row):
-                            row_errors.append(f"Ответ {answer} не допускает ответа {exception_answer}")
-                            errors_code.append(f"exception_answer")
-                if answer[:3] in question_required_answers.keys():
-                    questions_required = question_required_answers[answer[:3]]
-                    for possible_answer in possible_answers_list:
-                        if set(possible_answer).issubset(questions_required):
-                            count = 0
-                            for required_answer in possible_answer:
-                                if any(required_answer in cell[:3] for cell in row):
-                                    count = 1
-                                    break
-                            if not count:
-                                row_errors.append(
-                                    f"Ответ {answer} предполагает наличие ответа из списка: {possible_answer}")
-                                errors_code.append(f"required_answer")
-                if not any(answer[:3] in possible_answer for possible_answer in possible_answers_list) and answer[
-                                                                                                           :3] not in ignored_codes:
-                    row_errors.append(f"Ответа {answer} нет в анкете")
-                    errors_code.append(f"unnecessary_answer")
-                for i, possible_answer in enumerate(possible_answers_list):
-                    if answer[:3] in possible_answer:
-                        answers_count[idx][i] = answers_count[idx][i] + 1
-                        break
-            for i in range(len(question_max_answers)):
-                if answers_count[idx][i] > question_max_answers[i]:
-                    row_errors.append(f"Вопрос {i + 1}: Слишком много ответов. Максимум {question_max_answers[i]}")
-                    errors_code.append(f"max_limit_answer")
-                if answers_count[idx][i] < question_min_answers[i]:
-                    row_errors.append(f"Вопрос {i + 1}: Слишком мало ответов. Минимум {question_min_answers[i]}")
-                    errors_code.append(f"min_limit_answer")
+            row_errors, errors_code = validate_row(row, schema, ignored_codes, question_max_answers,
+                                                   question_min_answers, conditions)
         if row_errors:
             validation_errors.append({"row_index": idx, "errors": row_errors, "error_code": errors_code})
 
     return validation_errors if validation_errors else 0
 
 
-def correct_questionnaires(answers, possible_answers_list, ignored_codes, question_max_answers,
-                           question_min_answers, question_exception_answers, question_required_answers, errors,
-                           static_error):
+def validate_row(row, schema, ignored_codes, question_max_answers, question_min_answers, conditions):
+    """
+    Проверяет одну анкету на исключающие и обязательные условия, лишние коды и ограничения количества ответов.
+
+    Проверка уникальности анкеты выполняется вызывающей стороной.
+
+    Параметры:
+      - row (List[str]): Анкета — список строковых кодов ответов.
+      - остальные параметры совпадают с validate_questionnaires.
+
+    Возвращаемое значение:
+      Tuple[List[str], List[str]]: Сообщения об ошибках и соответствующие им коды ошибок.
+    """
+    row_errors = []
+    errors_code = []
+    row_mask = conditions.row_mask(row)
+    for answer in row:
+        for exception_answer in conditions.exception_hits(answer[:3], row_mask):
+            row_errors.append(f"Ответ {answer} не допускает ответа {exception_answer}")
+            errors_code.append(f"exception_answer")
+        for question_index in conditions.missing_required_questions(answer[:3], row_mask):
+            row_errors.append(f"Ответ {answer} предполагает наличие ответа из списка: "
+                              f"{schema.possible_answers_list[question_index]}")
+            errors_code.append(f"required_answer")
+        if answer[:3] not in schema.code_to_question and answer[:3] not in ignored_codes:
+            row_errors.append(f"Ответа {answer} нет в анкете")
+            errors_code.append(f"unnecessary_answer")
+    answers_count = schema.count_answers(row)
+    for i in range(len(question_max_answers)):
+        if answers_count[i] > question_max_answers[i]:
+            row_errors.append(f"Вопрос {i + 1}: Слишком много ответов. Максимум {question_max_answers[i]}")
+            errors_code.append(f"max_limit_answer")
+        if answers_count[i] < question_min_answers[i]:
+            row_errors.append(f"Вопрос {i + 1}: Слишком мало ответов. Минимум {question_min_answers[i]}")
+            errors_code.append(f"min_limit_answer")
+    return row_errors, errors_code
+
+
+def validate_answer_matrix(matrix, schema, ignored_codes, question_max_answers, question_min_answers,
+                           conditions, may_repeat, chunk_size=VALIDATION_CHUNK_SIZE):
+    """
+    Векторная проверка анкет, закодированных в AnswerMatrix.
+
+    Процесс включает:
+      1. Поиск повторяющихся анкет по отсортированным индексам кодов (если may_repeat=False).
+      2. Поиск нарушений для остальных анкет операциями над целыми массивами (find_invalid_rows),
+         порциями по chunk_size анкет.
+      3. Формирование сообщений через validate_row только для анкет с нарушениями.
+
+    Параметры:
+      - matrix (AnswerMatrix): Анкеты, закодированные по схеме опросника.
+      - chunk_size (int): Количество анкет, обрабатываемых за один проход (ограничивает объем памяти).
+      - остальные параметры совпадают с validate_questionnaires.
+
+    Возвращаемое значение:
+      List[Dict] | 0: Ошибки в том же формате, что и validate_questionnaires.
+    """
+    repeated = {}
+    if not may_repeat:
+        repeated = find_repeated_rows(matrix)
+    invalid = np.zeros(len(matrix), dtype=bool)
+    condition_matrices = compile_condition_matrices(matrix, schema, conditions)
+    for start in range(0, len(matrix), chunk_size):
+        end = min(start + chunk_size, len(matrix))
+        invalid[start:end] = find_invalid_rows(matrix.row_slice(start, end), schema, ignored_codes,
+                                               question_max_answers, question_min_answers, condition_matrices)
+    validation_errors = []
+    for idx in sorted(set(np.flatnonzero(invalid).tolist()) | set(repeated)):
+        if idx in repeated:
+            validation_errors.append({"row_index": idx,
+                                      "errors": [f"Анкета {idx + 1} совпадает с анкетой {repeated[idx] + 1}"],
+                                      "error_code": ["repeated_answer"]})
+            continue
+        row_errors, errors_code = validate_row(matrix.row(idx), schema, ignored_codes, question_max_answers,
+                                               question_min_answers, conditions)
+        if row_errors:
+            validation_errors.append({"row_index": idx, "errors": row_errors, "error_code": errors_code})
+    return validation_errors if validation_errors else 0
+
+
+def find_repeated_rows(matrix):
+    """
+    Находит анкеты, повторяющие более раннюю анкету (с точностью до порядка ячеек).
+
+    Ключ анкеты — байтовое представление отсортированных индексов кодов; для анкет с открытыми
+    ответами к ключу добавляются пары (индекс кода, текст).
+
+    Возвращаемое значение:
+      Dict[int, int]: Индекс повторяющейся анкеты -> индекс первой такой же анкеты.
+    """
+    row_ids = matrix.row_ids()
+    order = np.lexsort((matrix.indices, row_ids))
+    sorted_indices = matrix.indices[order]
+    buffer = sorted_indices.tobytes()
+    itemsize = sorted_indices.itemsize
+    row_texts = {}
+    for cell_index, text in matrix.texts.items():
+        row_texts.setdefault(int(row_ids[cell_index]), []).append((int(matrix.indices[cell_index]), text))
+    bounds = matrix.indptr.tolist()
+    seen_rows = {}
+    repeated = {}
+    for idx in range(len(matrix)):
+        key = buffer[bounds[idx] * itemsize:bounds[idx + 1] * itemsize]
+        if idx in row_texts:
+            key = (key, tuple(sorted(row_texts[idx])))
+        if key in seen_rows:
+            repeated[idx] = seen_rows[key]
+        else:
+            seen_rows[key] = idx
+    return repeated
+
+
+def compile_condition_matrices(matrix, schema, conditions):
+    """
+    Преобразует исключающие и обязательные условия в разреженные матрицы над словарем AnswerMatrix.
+
+    Возвращаемое значение:
+      Tuple[csr_matrix, csr_matrix]:
+        - exception_matrix: (словарь × словарь), 1 — код строки не допускает код столбца.
+        - required_matrix: (словарь × вопросы), 1 — код строки предполагает ответ на вопрос столбца.
+    """
+    code_to_id = {}
+    for idx, code in enumerate(matrix.vocab.tolist()):
+        code_to_id.setdefault(code, idx)
+    vocab_size = len(matrix.vocab)
+    rows, cols = [], []
+    for code, exception_answers in conditions.exception_answers.items():
+        if code in code_to_id:
+            for exception_answer in exception_answers:
+                if exception_answer in code_to_id:
+                    rows.append(code_to_id[code])
+                    cols.append(code_to_id[exception_answer])
+    exception_matrix = csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(vocab_size, vocab_size))
+    rows, cols = [], []
+    for code, required_questions in conditions.required_questions.items():
+        if code in code_to_id:
+            for i in required_questions:
+                rows.append(code_to_id[code])
+                cols.append(i)
+    required_matrix = csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                                 shape=(vocab_size, schema.questions_count))
+    return exception_matrix, required_matrix
+
+
+def find_invalid_rows(matrix, schema, ignored_codes, question_max_answers, question_min_answers, condition_matrices):
+    """
+    Определяет анкеты с нарушениями условий операциями над целыми массивами.
+
+    Процесс включает:
+      1. Подсчет ответов по вопросам (n × вопросы) и сравнение с минимумом и максимумом.
+      2. Поиск кодов вне опросника, не входящих в ignored_codes.
+      3. Исключающие условия: ненулевые элементы (P · E) ∘ P, где P — матрица присутствия кодов.
+      4. Обязательные условия: вопросы, требуемые кодами анкеты (P · R > 0), на которые нет ответа.
+
+    Возвращаемое значение:
+      np.ndarray: Булев массив длины len(matrix), True — анкета содержит нарушения.
+    """
+    exception_matrix, required_matrix = condition_matrices
+    counts = matrix.question_counts(schema)
+    invalid = ((counts > np.asarray(question_max_answers)) | (counts < np.asarray(question_min_answers))).any(axis=1)
+    unknown_codes = np.ones(len(matrix.vocab), dtype=bool)
+    unknown_codes[:matrix.known_count] = False
+    unknown_codes &= ~np.isin(matrix.vocab, list(ignored_codes))
+    unknown_cells = unknown_codes[matrix.indices]
+    invalid[np.unique(matrix.row_ids()[unknown_cells])] = True
+    presence = matrix.to_csr()
+    presence.data[:] = 1
+    exception_hits = (presence @ exception_matrix).multiply(presence).tocsr()
+    invalid |= np.diff(exception_hits.indptr) > 0
+    required = (presence @ required_matrix).toarray() > 0
+    invalid |= (required & (counts == 0)).any(axis=1)
+    return invalid
+
+
+class IncrementalValidator:
+    """
+    Валидатор, проверяющий только анкеты, добавленные после последней фиксации.
+
+    Между вызовами хранит отпечатки (row_fingerprint) уже проверенных анкет с их номерами для поиска дубликатов
+    и длину проверенного префикса списка анкет. Отпечатки хранятся в одной структуре: в фильтре fingerprints,
+    если он хранит номера анкет (FingerprintSet), иначе в словаре seen_rows. Предполагается, что анкеты
+    префикса после фиксации не изменяются и не удаляются: исправления и удаления затрагивают только новые анкеты.
+
+    Зафиксированные анкеты можно освободить (release): для поиска дубликатов достаточно их отпечатков,
+    а номера анкет в сообщениях продолжают сквозную нумерацию.
+
+    Параметры конструктора совпадают с validate_questionnaires (без answers), а также:
+      - check_rows (bool): Проверять ли новые анкеты на условия. Если False, ищутся только повторы
+        (для анкет, сгенерированных корректными по условиям, см. GenerationConstraints).
+      - fingerprints (FingerprintSet | BloomFilter | None): Фильтр отпечатков зафиксированных анкет
+        (см. compile_fingerprint_filter). Пополняется при фиксации и передается генератору для отбора повторов.
+      - row_numbers (bool): Указывать ли в сообщении о повторе номер совпавшей анкеты при фильтре BloomFilter
+        (для этого отпечатки дополнительно хранятся в seen_rows). Если False, повторы ищутся только по фильтру —
+        память не зависит от количества анкет.
+    """
+
+    def __init__(self, schema, ignored_codes, question_max_answers, question_min_answers,
+                 conditions, may_repeat, engine="python", check_rows=True, fingerprints=None, row_numbers=True):
+        self.schema = schema
+        self.ignored_codes = ignored_codes
+        self.question_max_answers = question_max_answers
+        self.question_min_answers = question_min_answers
+        self.conditions = conditions
+        self.may_repeat = may_repeat
+        self.engine = engine
+        self.check_rows = check_rows
+        self.fingerprints = fingerprints
+        self.row_numbers = row_numbers
+        self.committed_fingerprints = None
+        self.seen_rows = None
+        if fingerprints is None or (row_numbers and isinstance(fingerprints, BloomFilter)):
+            self.seen_rows = {}
+        self.validated_count = 0
+        self.released_count = 0
+
+    def validate(self, answers):
+        """
+        Проверяет анкеты answers[validated_count:].
+
+        Процесс включает:
+          1. Поиск дубликатов среди новых анкет и среди уже зафиксированных (по сохраненным ключам).
+          2. Проверку остальных новых анкет через validate_row (или find_invalid_rows при engine="numpy"),
+             если check_rows=True.
+
+        Возвращаемое значение:
+          List[Dict] | 0: Ошибки в формате validate_questionnaires с индексами строк в полном списке answers.
+        """
+        start = self.validated_count
+        new_rows = answers[start:]
+        repeated = {}
+        if not self.may_repeat:
+            new_seen = {}
+            for offset, row in enumerate(new_rows):
+                key = row_fingerprint(row)
+                prev_idx = new_seen.get(key)
+                if prev_idx is None:
+                    prev_idx = self.row_index(key)
+                if prev_idx is not None:
+                    repeated[start + offset] = prev_idx
+                else:
+                    new_seen[key] = self.released_count + start + offset
+        if not self.check_rows:
+            candidates = []
+        elif self.engine == "numpy" and new_rows:
+            matrix = AnswerMatrix.from_rows(new_rows, self.schema)
+            condition_matrices = compile_condition_matrices(matrix, self.schema, self.conditions)
+            invalid = find_invalid_rows(matrix, self.schema, self.ignored_codes, self.question_max_answers,
+                                        self.question_min_answers, condition_matrices)
+            candidates = (start + np.flatnonzero(invalid)).tolist()
+        else:
+            candidates = range(start, len(answers))
+        validation_errors = []
+        for idx in sorted(set(candidates) | set(repeated)):
+            if idx in repeated:
+                row_number = self.released_count + idx + 1
+                if repeated[idx] < 0:
+                    message = f"Анкета {row_number} совпадает с одной из ранее проверенных анкет"
+                else:
+                    message = f"Анкета {row_number} совпадает с анкетой {repeated[idx] + 1}"
+                validation_errors.append({"row_index": idx, "errors": [message], "error_code": ["repeated_answer"]})
+                continue
+            row_errors, errors_code = validate_row(answers[idx], self.schema, self.ignored_codes,
+                                                   self.question_max_answers, self.question_min_answers,
+                                                   self.conditions)
+            if row_errors:
+                validation_errors.append({"row_index": idx, "errors": row_errors, "error_code": errors_code})
+        return validation_errors if validation_errors else 0
+
+    def row_index(self, key):
+        """
+        Возвращает номер зафиксированной анкеты с отпечатком key (-1, если номер неизвестен) или None.
+        """
+        if self.seen_rows is not None:
+            return self.seen_rows.get(key)
+        return self.fingerprints.row_index(key)
+
+    def commit(self, answers):
+        """
+        Фиксирует все анкеты answers как проверенные: их ключи добавляются в множество для поиска дубликатов
+        и в фильтр fingerprints.
+        """
+        if not self.may_repeat:
+            for idx in range(self.validated_count, len(answers)):
+                key = row_fingerprint(answers[idx])
+                if self.fingerprints is not None:
+                    self.fingerprints.add(key, self.released_count + idx)
+                    if self.committed_fingerprints is not None:
+                        self.committed_fingerprints.append(key)
+                if self.seen_rows is not None:
+                    self.seen_rows.setdefault(key, self.released_count + idx)
+        self.validated_count = len(answers)
+
+    def take_committed_fingerprints(self):
+        """
+        Возвращает отпечатки анкет, добавленных в фильтр fingerprints после предыдущего вызова
+        (для рассылки в пул генерации, см. GenerationPool.update). Отпечатки накапливаются после первого вызова.
+        """
+        committed_fingerprints = self.committed_fingerprints or []
+        self.committed_fingerprints = []
+        return committed_fingerprints
+
+    def release(self, answers):
+        """
+        Освобождает зафиксированные анкеты: возвращает answers без проверенного префикса.
+
+        Отпечатки освобожденных анкет остаются для поиска дубликатов, а следующие анкеты нумеруются после них.
+        """
+        remaining_answers = answers[self.validated_count:]
+        self.released_count += self.validated_count
+        self.validated_count = 0
+        return remaining_answers
+
+
+def correct_questionnaires(answers, schema, ignored_codes, question_max_answers,
+                           question_min_answers, conditions, errors, static_error, frequency_model=None):
     """
     Исправляет ошибки в анкетах на основе результатов валидации и статистических данных.
 
@@ -107,14 +396,15 @@ def correct_questionnaires(answers, possible_answers_list, ignored_codes, questi
 
     Параметры:
       answers (List[List[str]]): Список анкет, где каждая анкета — список строковых кодов ответов.
-      possible_answers_list (List[List[str]]): Список допустимых вариантов ответов для каждого вопроса.
+      schema (Questionnaire): Скомпилированная схема опросника.
       ignored_codes (List[str]): Коды, исключенные из анализа (например, резервные или служебные коды).
       question_max_answers (List[int]): Максимальное количество ответов на каждый вопрос.
       question_min_answers (List[int]): Минимальное количество ответов на каждый вопрос.
-      question_exception_answers (Dict[str, List[str]]): Исключающие условия (код ответа -> список исключенных кодов).
-      question_required_answers (Dict[str, List[str]]): Обязующие условия (код ответа -> список требуемых кодов).
+      conditions (ConditionRules): Скомпилированные исключающие и обязательные условия (см. compile_conditions).
       errors (List[Dict]): Список ошибок из validate_questionnaires с индексами строк и кодами ошибок.
       static_error (float): Порог статической ошибки для коррекции частот (используется в get_frequencies).
+      frequency_model (FrequencyModel | None): Счетчики ответов по всем анкетам answers. Если переданы, частоты
+        берутся из них вместо пересчета по всем анкетам, а исправленные и удаленные анкеты учитываются в счетчиках.
 
     Возвращаемое значение:
       List[List[str]]: Обновлённый список анкет после исправления ошибок:
@@ -122,59 +412,144 @@ def correct_questionnaires(answers, possible_answers_list, ignored_codes, questi
         - Добавлены/удалены ответы в соответствии с правилами.
     """
     answers_to_delete = []
-    frequencies = get_frequencies(answers, possible_answers_list, static_error)
+    sampling_tables = compile_sampling_tables(schema,
+                                              get_model_frequencies(answers, schema, static_error, frequency_model))
     for error in errors:
-        removed_answers = []
-        added_answers = []
         error['error_code'] = set(error['error_code'])
         if 'repeated_answer' in error['error_code']:
-            answers_to_delete.append(answers[error['row_index']])
-
-        if 'exception_answer' in error['error_code']:
-            handeling_exception = handle_exception_answer(answers[error['row_index']], question_exception_answers,
-                                                          possible_answers_list)
-            for answer in handeling_exception:
-                if answer in answers[error['row_index']]:
-                    answers[error['row_index']].remove(answer)
-                    removed_answers.append(answer)
-
-        if 'required_answer' in error['error_code']:
-            handeling_required = handle_required_answer(answers[error['row_index']], question_required_answers,
-                                                        possible_answers_list, frequencies)
-            for answer in handeling_required:
-                answers[error['row_index']].append(answer)
-                added_answers.append(answer)
-
-        if 'unnecessary_answer' in error['error_code']:
-            handeling_unnecessary = handle_unnecessary_answer(answers[error['row_index']], possible_answers_list,
-                                                              ignored_codes)
-            for answer in handeling_unnecessary:
-                if answer in answers[error['row_index']]:
-                    answers[error['row_index']].remove(answer)
-                    removed_answers.append(answer)
-
-        if 'max_limit_answer' in error['error_code'] or 'min_limit_answer' in error['error_code']:
-            handeling_max_limit_remove, handeling_max_limit_append, handeling_min_limit_append = handle_limit_answer(
-                answers[error['row_index']], error['row_index'], possible_answers_list, question_max_answers,
-                frequencies, question_min_answers)
-            for answer in handeling_max_limit_remove:
-                if answer in answers[error['row_index']]:
-                    answers[error['row_index']].remove(answer)
-                    removed_answers.append(answer)
-            for answer in handeling_max_limit_append:
-                answers[error['row_index']].append(answer)
-                added_answers.append(answer)
-            for answer in handeling_min_limit_append:
-                answers[error['row_index']].append(answer)
-                added_answers.append(answer)
-
-        if removed_answers:
-            logger.info(f'Из анкеты {error['row_index'] + 1} удалены ответы: {','.join(removed_answers)}.')
-        if added_answers:
-            logger.info(f'В анкету {error['row_index'] + 1} добавлены ответы: {','.join(added_answers)}.')
-        answers[error['row_index']] = sorted(answers[error['row_index']])
-    for idx, answer_to_delete in enumerate(answers_to_delete):
-        row = answers.index(answer_to_delete)
-        answers.remove(answer_to_delete)
-        logger.info(f"Анкета {row + idx + 1} удалена.")
+            answers_to_delete.append(error['row_index'])
+        old_row = list(answers[error['row_index']])
+        answers[error['row_index']] = correct_row(answers[error['row_index']], error['row_index'],
+                                                  error['error_code'], schema, ignored_codes, question_max_answers,
+                                                  question_min_answers, conditions, sampling_tables)
+        if frequency_model is not None:
+            frequency_model.replace_row(old_row, answers[error['row_index']])
+    if frequency_model is not None:
+        frequency_model.remove_rows(answers[row] for row in set(answers_to_delete))
+    delete_rows(answers, answers_to_delete)
     return answers
+
+
+def correct_row(row, row_index, error_codes, schema, ignored_codes, question_max_answers, question_min_answers,
+                conditions, sampling_tables):
+    """
+    Исправляет одну анкету по кодам найденных в ней ошибок (кроме повторов, которые обрабатываются удалением).
+
+    Параметры:
+      - row (List[str]): Анкета — список строковых кодов ответов (изменяется на месте).
+      - row_index (int): Индекс анкеты (для логирования).
+      - error_codes (Set[str]): Коды ошибок анкеты из validate_questionnaires.
+      - sampling_tables (SamplingTables): Таблицы выбора кодов ответов по частотам (см. compile_sampling_tables).
+      - остальные параметры совпадают с correct_questionnaires.
+
+    Возвращаемое значение:
+      List[str]: Исправленная анкета, отсортированная по кодам ответов.
+    """
+    removed_answers = []
+    added_answers = []
+    if 'exception_answer' in error_codes:
+        handeling_exception = handle_exception_answer(row, conditions, schema)
+        for answer in handeling_exception:
+            if answer in row:
+                row.remove(answer)
+                removed_answers.append(answer)
+
+    if 'required_answer' in error_codes:
+        handeling_required = handle_required_answer(row, conditions, sampling_tables)
+        for answer in handeling_required:
+            row.append(answer)
+            added_answers.append(answer)
+
+    if 'unnecessary_answer' in error_codes:
+        handeling_unnecessary = handle_unnecessary_answer(row, schema, ignored_codes)
+        for answer in handeling_unnecessary:
+            if answer in row:
+                row.remove(answer)
+                removed_answers.append(answer)
+
+    if 'max_limit_answer' in error_codes or 'min_limit_answer' in error_codes:
+        handeling_max_limit_remove, handeling_max_limit_append, handeling_min_limit_append = handle_limit_answer(
+            row, row_index, schema, question_max_answers, sampling_tables, question_min_answers)
+        for answer in handeling_max_limit_remove:
+            if answer in row:
+                row.remove(answer)
+                removed_answers.append(answer)
+        for answer in handeling_max_limit_append:
+            row.append(answer)
+            added_answers.append(answer)
+        for answer in handeling_min_limit_append:
+            row.append(answer)
+            added_answers.append(answer)
+
+    if removed_answers:
+        logger.info(f'Из анкеты {row_index + 1} удалены ответы: {','.join(removed_answers)}.')
+    if added_answers:
+        logger.info(f'В анкету {row_index + 1} добавлены ответы: {','.join(added_answers)}.')
+    return sorted(row)
+
+
+def correct_questionnaires_locally(answers, schema, ignored_codes, question_max_answers, question_min_answers,
+                                   conditions, errors, static_error, max_attempts, frequency_model=None):
+    """
+    Исправляет анкеты с ошибками построчно: каждая анкета исправляется и перепроверяется до тех пор,
+    пока она не станет корректной или не будет исчерпано число попыток.
+
+    Процесс включает:
+      1. Расчет частот ответов и таблиц выбора один раз для всех анкет.
+      2. Для каждой анкеты с ошибками — чередование correct_row и validate_row (не более max_attempts раз).
+      3. Удаление повторяющихся анкет и анкет, которые не удалось исправить за max_attempts попыток.
+
+    Проверка уникальности анкет остается глобальной и выполняется вызывающей стороной после исправления.
+
+    Параметры:
+      - max_attempts (int): Максимальное количество попыток исправления одной анкеты.
+      - frequency_model (FrequencyModel | None): Счетчики ответов по всем анкетам answers (см. correct_questionnaires).
+      - остальные параметры совпадают с correct_questionnaires.
+
+    Возвращаемое значение:
+      Tuple[List[List[str]], int, List[int]]:
+        - answers: Обновлённый список анкет.
+        - attempts_count: Общее количество выполненных исправлений.
+        - not_converged: Индексы (до удаления) анкет, которые не удалось исправить и которые были удалены.
+    """
+    answers_to_delete = []
+    not_converged = []
+    attempts_count = 0
+    sampling_tables = compile_sampling_tables(schema,
+                                              get_model_frequencies(answers, schema, static_error, frequency_model))
+    for error in errors:
+        row_index = error['row_index']
+        error_codes = set(error['error_code'])
+        if 'repeated_answer' in error_codes:
+            answers_to_delete.append(row_index)
+            continue
+        attempts = 0
+        old_row = list(answers[row_index])
+        while error_codes and attempts < max_attempts:
+            answers[row_index] = correct_row(answers[row_index], row_index, error_codes, schema, ignored_codes,
+                                             question_max_answers, question_min_answers, conditions,
+                                             sampling_tables)
+            attempts += 1
+            _, row_error_codes = validate_row(answers[row_index], schema, ignored_codes, question_max_answers,
+                                              question_min_answers, conditions)
+            error_codes = set(row_error_codes)
+        attempts_count += attempts
+        if frequency_model is not None:
+            frequency_model.replace_row(old_row, answers[row_index])
+        if error_codes:
+            logger.info(f"Анкета {row_index + 1} не исправлена за {max_attempts} попыток.")
+            not_converged.append(row_index)
+            answers_to_delete.append(row_index)
+    if frequency_model is not None:
+        frequency_model.remove_rows(answers[row] for row in set(answers_to_delete))
+    delete_rows(answers, answers_to_delete)
+    return answers, attempts_count, not_converged
+
+
+def get_model_frequencies(answers, schema, static_error, frequency_model):
+    """
+    Возвращает частоты ответов из frequency_model или, если он не передан, рассчитывает их по answers.
+    """
+    if frequency_model is not None:
+        return frequency_model.frequencies()
+    return get_frequencies(answers, schema, static_error)